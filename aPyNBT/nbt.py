@@ -33,8 +33,55 @@ Short summary:
 This was written and tested using Python 3.6
 """
 
-from struct import iter_unpack, pack, unpack
-from typing import Any, Dict, List, Tuple
+from array import array
+from functools import lru_cache
+import mmap
+import os
+import shutil
+from struct import Struct
+from sys import byteorder, intern
+import tempfile
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Drop-in replacements for the gzip module are used for NBT files if they're
+# installed. In order of preference:
+#
+#   - rapidgzip: parallel decompression; only used for reading
+#   - isal (python-isal): ISA-L accelerated compression and decompression
+#   - gzip: the standard library
+try:
+    from isal import igzip as gzip
+except ImportError:
+    import gzip
+
+try:
+    import rapidgzip
+except ImportError:
+    rapidgzip = None
+
+# The process's umask, which serialize_file() applies to the files it creates.
+# It can only be read by setting it.
+UMASK: int = os.umask(0)
+os.umask(UMASK)
+
+# Compiled structs for the unsigned lengths that prefix names, strings, and
+# arrays (and TAG_List's element count).
+USHORT: Struct = Struct("!H")
+UINT: Struct = Struct("!I")
+
+# Tag names are few and repeated often (e.g. "x", "y", "z", "Level"). Decoded
+# names are cached by their encoded bytes, which skips decoding a name that's
+# been seen before and shares one (interned) string between all tags with the
+# same name. The cache stops growing once it holds NAME_CACHE_SIZE names.
+NAME_CACHE_SIZE: int = 4096
+_name_cache: Dict[bytes, str] = {}
+
+# TAG_String payloads repeat just as often (e.g. block ids, biome names), so
+# short ones are cached the same way. Long strings (e.g. book pages) are rarely
+# repeated and are always decoded.
+STRING_CACHE_SIZE: int = 4096
+STRING_CACHE_MAX_LENGTH: int = 64
+_string_cache: Dict[bytes, str] = {}
 
 
 class Tag:
@@ -50,11 +97,26 @@ class Tag:
     # "tag id", an immutable attribute of a specific subclass of Tag
     tid: int = None
 
+    # The serialized tag id, set for each subclass with a tid
+    _tid_bytes: bytes = None
+
+    # The struct format of a fixed-width payload (or of each of its elements)
+    sformat: str = None
+
     # Is the tag's payload an equivalent basic Python type (int, str, etc)?
     # This is a class attribute that permits significant performance gains
     # during serialization or deserialization.
     _is_primitive: bool = False
 
+    # Does the tag's payload contain other tags (TAG_Compound and TAG_List)?
+    # Such payloads are deserialized by deserialize_nested().
+    _is_nested: bool = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.tid is not None:
+            cls._tid_bytes = cls.tid.to_bytes(1, byteorder='big', signed=False)
+
     def __init__(self, nbt_data: memoryview = None, name: str = None, payload: Any = None, named: bool = None, tagged: bool = True):
         """ Instantiation for all decedent tag types
 
@@ -142,43 +204,63 @@ class Tag:
             else:
                 self.name = ""
 
-    def deserialize(self, data: memoryview):
+    def deserialize(self, data: memoryview, offset: int = 0) -> int:
         """
         Deserialize a blob of data and set the `name` and `payload` attributes
             of the tag.
-        """
-        offset = 0
 
+        The tag starts at `offset` within the data. All of the deserialize*()
+            methods read at an offset into the one buffer instead of slicing it,
+            and return the offset of the first byte following what they read.
+            The data is handled as a memoryview so that the slices that are
+            taken (e.g. the raw bytes of arrays) share the original buffer
+            rather than copying it.
+        """
+        if type(data) is not memoryview:
+            data = memoryview(data)
+        end = self.deserialize_payload(data, self.deserialize_header(data, offset))
+        self._size = end - offset
+        return end
+
+    def deserialize_header(self, data: memoryview, offset: int) -> int:
+        """ Skip the tag id and set the `name` attribute
+        """
         # Tags in lists don't have a tag id byte.
         if self._tagged:
-            offset = 1  # 1 byte processed (tag id)
+            offset += 1  # 1 byte processed (tag id)
 
         # Tags in lists don't have a name.
         if self._named:
-            offset += self.deserialize_name(data[offset:])
+            offset = self.deserialize_name(data, offset)
         else:
             self.name = ""
 
-        # Reminder: Payload parsing may recurse!
-        offset += self.deserialize_payload(data[offset:])
-        self._size = offset
+        return offset
 
-    def deserialize_name(self, data: memoryview,
-            _unpack=unpack,
+    def deserialize_name(self, data: memoryview, offset: int,
+            _ushort_unpack_from=USHORT.unpack_from,
             _memview_to_bytes=memoryview.tobytes,
-            _bytes_decode=bytes.decode) -> int:
+            _bytes_decode=bytes.decode,
+            _intern=intern,
+            _name_cache=_name_cache) -> int:
         """ Sets the `name` attribute
 
         The constructor is a mess because this method is called *very*
             frequently and must be optimized to avoid attribute lookups for
-            `unpack`, `memoryview`, and `bytes`.
+            `USHORT`, `memoryview`, `bytes`, and the name cache.
         """
-        string_size = _unpack("!H", data[:2])[0]
-        width = 2 + string_size
-        self.name = _bytes_decode(_memview_to_bytes(data[2:width]))
-        return width
-
-    def deserialize_payload(self, data: memoryview) -> int:
+        start = offset + 2
+        end = start + _ushort_unpack_from(data, offset)[0]
+        encoded_name = _memview_to_bytes(data[start:end])
+        name = _name_cache.get(encoded_name)
+        if name is None:
+            name = _intern(_bytes_decode(encoded_name))
+            if len(_name_cache) < NAME_CACHE_SIZE:
+                _name_cache[encoded_name] = name
+        self.name = name
+        return end
+
+    def deserialize_payload(self, data: memoryview, offset: int) -> int:
         """ Sets the `payload` attribute
 
         This is specific to each tag and implemented in the respective tag class.
@@ -186,22 +268,32 @@ class Tag:
         raise NotImplementedError
 
     @classmethod
-    def deserialize_primitive(cls, data: memoryview) -> Tuple[Any, int]:
+    def deserialize_primitive(cls, data: memoryview, offset: int = 0) -> Tuple[Any, int]:
         """
         If the tag's payload can be represented as a basic Python type, a
-            subclass of Tag implements this method. Passed bytes are converted to
-            the tag's payload's type. The value is returned along with the number
-            of bytes deserialized ("width").
+            subclass of Tag implements this method. Bytes at `offset` are
+            converted to the tag's payload's type. The value is returned along
+            with the number of bytes deserialized ("width").
         """
         raise NotImplementedError
 
     def serialize(self) -> bytes:
         """ Returns this tag's representation in bytes
+
+        The return value is always `bytes`, never a view of the deserialized
+            data.
         """
-        # Special-case: TAG_End is defined as 0x00
-        if isinstance(self, TAG_End):
-            return b"\x00"
+        data = bytearray()
+        self.serialize_into(data)
+        return bytes(data)
+
+    def serialize_into(self, data: bytearray):
+        """ Appends this tag's representation in bytes to `data`
 
+        Tags within a TAG_Compound or TAG_List are appended to the same
+            bytearray as their parent, rather than each being serialized into
+            bytes which are then copied into the parent's.
+        """
         # Can't serialize a base-class!
         assert self.tid is not None
 
@@ -209,18 +301,37 @@ class Tag:
         assert self._named is not None
         assert self._tagged is not None
 
-        data = b''
         data += self.serialize_tid()
         data += self.serialize_name()
-        data += self.serialize_payload()
-        return data
+        self.serialize_payload_into(data)
+
+    def serialized_size(self) -> int:
+        """ Returns the number of bytes serialize() returns
+
+        Unlike `_size`, which is set by deserialization, this reflects the
+            tag's current name and payload. See serialized_payload_size().
+        """
+        size = 1 if self._tagged else 0
+        if self._named:
+            size += 2 + len((self.name or "").encode('utf-8'))
+        return size + self.serialized_payload_size()
+
+    def serialized_payload_size(self) -> int:
+        """ Returns the number of bytes in the payload's representation
+
+        Every tag type overrides this to compute it without serializing the
+            payload; serializing it is only the fallback.
+        """
+        data = bytearray()
+        self.serialize_payload_into(data)
+        return len(data)
 
     def serialize_tid(self) -> bytes:
         """ Convert the tag's id into its representation in bytes
         """
         if not self._tagged:
             return b''
-        return self.tid.to_bytes(1, byteorder='big', signed=False)
+        return self._tid_bytes
 
     def serialize_name(self) -> bytes:
         """ Convert the tag's name into its representation in bytes
@@ -239,7 +350,7 @@ class Tag:
             self.name = ""
 
         encoded_string = self.name.encode('utf-8')
-        encoded_length = len(encoded_string).to_bytes(2, byteorder='big', signed=False)
+        encoded_length = USHORT.pack(len(encoded_string))
         return encoded_length + encoded_string
 
     def serialize_payload(self) -> bytes:
@@ -249,6 +360,14 @@ class Tag:
         """
         raise NotImplementedError
 
+    def serialize_payload_into(self, data: bytearray):
+        """ Appends the tag's payload's representation in bytes to `data`
+
+        Tags that contain other tags override this, and implement
+            serialize_payload() by calling it.
+        """
+        data += self.serialize_payload()
+
     @classmethod
     def serialize_primitive(cls, value: Any) -> bytes:
         """ The reverse of Tag.deserialize_primitive()
@@ -277,14 +396,31 @@ class TAG_End(Tag):
 
     tid: int = 0x00
 
-    _size: int = 1
-
     def __init__(self, *args, **kwargs):
         self.name = None
         self.payload = None
+        self._size = 1
         self._named = False
         self._tagged = True
 
+    def deserialize(self, data: memoryview, offset: int = 0) -> int:
+        return offset + 1
+
+    def serialize_into(self, data: bytearray):
+        # Special-case: TAG_End is defined as 0x00
+        data += b"\x00"
+
+    def serialized_size(self) -> int:
+        return 1
+
+    def serialized_payload_size(self) -> int:
+        return 0
+
+
+# TAG_End has no state of its own, so every deserialized TAG_Compound ends with
+# this one instance instead of allocating a new one.
+TAG_END_SINGLETON: TAG_End = TAG_End()
+
 
 class TagInt(Tag):
     """ Parent-class for tags with an integer-typed payload
@@ -296,26 +432,28 @@ class TagInt(Tag):
 
     _is_primitive: bool = True
 
+    # Compiled struct for the payload's format, set by each subclass
+    sstruct: Struct = None
+
     @classmethod
-    def deserialize_primitive(cls, data: memoryview) -> Tuple[int, int]:
-        value = int.from_bytes(
-            data[:cls.width],
-            byteorder='big',
-            signed=True
-        )
+    def deserialize_primitive(cls, data: memoryview, offset: int = 0) -> Tuple[int, int]:
+        value: int = cls.sstruct.unpack_from(data, offset)[0]
         return value, cls.width
 
     @classmethod
     def serialize_primitive(cls, value: int) -> bytes:
-        return value.to_bytes(cls.width, byteorder='big', signed=True)
+        return cls.sstruct.pack(value)
 
-    def deserialize_payload(self, data: memoryview) -> int:
-        self.payload, width = self.deserialize_primitive(data)
-        return width
+    def deserialize_payload(self, data: memoryview, offset: int) -> int:
+        self.payload = self.sstruct.unpack_from(data, offset)[0]
+        return offset + self.width
 
     def serialize_payload(self) -> bytes:
         return self.serialize_primitive(self.payload)
 
+    def serialized_payload_size(self) -> int:
+        return self.width
+
     def validate(self):
         assert isinstance(self.payload, int)
         self.payload.to_bytes(self.width, byteorder='big', signed=True)
@@ -327,6 +465,8 @@ class TAG_Byte(TagInt):
 
     tid: int = 0x01
     width: int = 1
+    sformat: str = "!b"
+    sstruct: Struct = Struct(sformat)
 
 
 class TAG_Short(TagInt):
@@ -335,6 +475,8 @@ class TAG_Short(TagInt):
 
     tid: int = 0x02
     width: int = 2
+    sformat: str = "!h"
+    sstruct: Struct = Struct(sformat)
 
 
 class TAG_Int(TagInt):
@@ -343,6 +485,8 @@ class TAG_Int(TagInt):
 
     tid: int = 0x03
     width: int = 4
+    sformat: str = "!i"
+    sstruct: Struct = Struct(sformat)
 
 
 class TAG_Long(TagInt):
@@ -351,32 +495,44 @@ class TAG_Long(TagInt):
 
     tid: int = 0x04
     width: int = 8
+    sformat: str = "!q"
+    sstruct: Struct = Struct(sformat)
 
 
 class TagFloat(Tag):
     """ Parent class for floating point tag types
+
+    Payloads are Python floats, (un)packed with each subclass's compiled struct.
+        A Python float is double precision, so a TAG_Float's payload is rounded
+        to single precision when serialized.
     """
 
     __slots__ = tuple()
 
     _is_primitive: bool = True
 
+    # Compiled struct for the payload's format, set by each subclass
+    sstruct: Struct = None
+
     @classmethod
-    def deserialize_primitive(cls, data: memoryview) -> Tuple[float, int]:
-        value: float = unpack(cls.sformat, data[:cls.width])[0]
+    def deserialize_primitive(cls, data: memoryview, offset: int = 0) -> Tuple[float, int]:
+        value: float = cls.sstruct.unpack_from(data, offset)[0]
         return value, cls.width
 
     @classmethod
     def serialize_primitive(cls, value: float) -> bytes:
-        return pack(cls.sformat, value)
+        return cls.sstruct.pack(value)
 
-    def deserialize_payload(self, data: memoryview) -> int:
-        self.payload, width = self.deserialize_primitive(data)
-        return width
+    def deserialize_payload(self, data: memoryview, offset: int) -> int:
+        self.payload = self.sstruct.unpack_from(data, offset)[0]
+        return offset + self.width
 
     def serialize_payload(self) -> bytes:
         return self.serialize_primitive(self.payload)
 
+    def serialized_payload_size(self) -> int:
+        return self.width
+
     def validate(self):
         assert isinstance(self.payload, float)
 
@@ -388,6 +544,7 @@ class TAG_Float(TagFloat):
     tid: int = 0x05
     width: int = 4
     sformat: str = "!f"
+    sstruct: Struct = Struct(sformat)
 
 
 class TAG_Double(TagFloat):
@@ -397,6 +554,7 @@ class TAG_Double(TagFloat):
     tid: int = 0x06
     width: int = 8
     sformat: str = "!d"
+    sstruct: Struct = Struct(sformat)
 
 
 class TagIterable(Tag):
@@ -423,23 +581,98 @@ class TagIterable(Tag):
     array_size_width: int = None
 
 
-class TAG_Byte_Array(TagIterable):
+class TagArray(TagIterable):
+    """ Parent-class for length-prefixed arrays of fixed-width values
+
+    Deserialization is lazy. The bytes of the array are kept as a slice of the
+        buffer passed to the constructor (a memoryview slice is zero-copy) and
+        are only converted into Python objects when the "payload" attribute is
+        first read. An array that's never looked at is written back out by
+        serialize_payload() as-is, without ever being converted.
+    """
+
+    __slots__ = ("_raw",)
+
+    array_size_width: int = 4  # int
+    width: int = None
+
+    # The "payload" slot declared by Tag, made reachable under another name
+    # since the "payload" property below shadows it.
+    _payload = Tag.payload
+
+    @property
+    def payload(self) -> Any:
+        if self._raw is not None:
+            self._payload = self.deserialize_raw(self._raw)
+            self._raw = None
+        return self._payload
+
+    @payload.setter
+    def payload(self, value: Any):
+        self._raw = None
+        self._payload = value
+
+    def __getstate__(self) -> Tuple[None, Dict[str, Any]]:
+        """ Pickle the raw bytes as a copy rather than converting them
+
+        A memoryview can't be pickled.
+        """
+        raw = self._raw
+        if raw is not None:
+            raw = raw.tobytes()
+        return None, {
+            "name": self.name, "_payload": self._payload, "_raw": raw,
+            "_size": self._size, "_tagged": self._tagged, "_named": self._named
+        }
+
+    def deserialize_payload(self, data: memoryview, offset: int, _uint_unpack_from=UINT.unpack_from) -> int:
+        array_size: int = _uint_unpack_from(data, offset)[0]
+        start = offset + 4
+        end = start + self.width * array_size
+        self._payload = None
+        self._raw = data[start:end]
+        return end
+
+    @classmethod
+    def deserialize_raw(cls, raw: memoryview) -> Any:
+        """ Convert the bytes of the array's elements into the payload
+        """
+        raise NotImplementedError
+
+    def serialize_payload(self) -> bytes:
+        # Untouched since deserialization; the original bytes are still valid.
+        # join() copies straight out of the buffer (no intermediate bytes).
+        if self._raw is not None:
+            return b''.join((UINT.pack(len(self._raw) // self.width), self._raw))
+        return self.serialize_elements()
+
+    def serialized_payload_size(self) -> int:
+        if self._raw is not None:
+            return self.array_size_width + len(self._raw)
+        return self.array_size_width + self.width * len(self.payload)
+
+    def serialize_elements(self) -> bytes:
+        """ The reverse of deserialize_raw(), including the array size
+        """
+        raise NotImplementedError
+
+
+class TAG_Byte_Array(TagArray):
 
     __slots__ = tuple()
 
     tid: int = 0x07
-    array_size_width = 4  # int
     width: int = 1
 
-    def deserialize_payload(self, data: memoryview, _unpack=unpack) -> int:
-        array_size: int = _unpack("!I", data[:4])[0]
-        self.payload: bytearray = bytearray(data[4:4 + array_size])
-        return 4 + array_size
+    @classmethod
+    def deserialize_raw(cls, raw: memoryview) -> bytearray:
+        return bytearray(raw)
 
-    def serialize_payload(self) -> bytes:
-        data: bytes = len(self.payload).to_bytes(self.array_size_width, byteorder='big', signed=False)
-        data += bytes(self.payload)
-        return data
+    def serialize_elements(self) -> bytes:
+        payload = self.payload
+        if not isinstance(payload, (bytes, bytearray, memoryview)):
+            payload = bytes(payload)  # e.g. a list of ints
+        return b''.join((UINT.pack(len(payload)), payload))
 
     def validate(self):
         assert isinstance(self.payload, bytearray)
@@ -455,35 +688,41 @@ class TAG_String(Tag):
     _is_primitive: bool = True
 
     @classmethod
-    def deserialize_primitive(cls, data: memoryview, _unpack=unpack) -> Tuple[str, int]:
-        string_size = _unpack("!H", data[:2])[0]
+    def deserialize_primitive(cls, data: memoryview, offset: int = 0,
+            _ushort_unpack_from=USHORT.unpack_from,
+            _string_cache=_string_cache) -> Tuple[str, int]:
+        string_size = _ushort_unpack_from(data, offset)[0]
 
         if string_size == 0:
             return "", cls.string_size_width
 
-        string_width = 2 + string_size
-        string_value = data[2:string_width].tobytes().decode('utf-8')
-        return string_value, string_width
+        start = offset + 2
+        encoded_string = data[start:start + string_size].tobytes()
+        if string_size > STRING_CACHE_MAX_LENGTH:
+            return encoded_string.decode('utf-8'), 2 + string_size
+
+        string_value = _string_cache.get(encoded_string)
+        if string_value is None:
+            string_value = encoded_string.decode('utf-8')
+            if len(_string_cache) < STRING_CACHE_SIZE:
+                _string_cache[encoded_string] = string_value
+        return string_value, 2 + string_size
 
     @classmethod
     def serialize_primitive(cls, value: str) -> bytes:
-        data = b''
         encoded_string: bytes = value.encode('utf-8')
-        data += len(encoded_string).to_bytes(
-            cls.string_size_width,
-            byteorder='big',
-            signed=False
-        )
-        data += encoded_string
-        return data
+        return USHORT.pack(len(encoded_string)) + encoded_string
 
-    def deserialize_payload(self, data: memoryview) -> int:
-        self.payload, payload_width = self.deserialize_primitive(data[self._size:])
-        return payload_width
+    def deserialize_payload(self, data: memoryview, offset: int) -> int:
+        self.payload, payload_width = self.deserialize_primitive(data, offset)
+        return offset + payload_width
 
     def serialize_payload(self) -> bytes:
         return self.serialize_primitive(self.payload)
 
+    def serialized_payload_size(self) -> int:
+        return self.string_size_width + len(self.payload.encode('utf-8'))
+
     def validate(self):
         assert isinstance(self.payload, str)
 
@@ -495,6 +734,8 @@ class TAG_List(TagIterable):
     tid: int = 0x09
     array_size_width: int = 4  # int
 
+    _is_nested: bool = True
+
     def __init__(self, *args, tagID: int = None, **kwargs,):
         """
         The "tagID" attribute (as its called in the spec) is unique to
@@ -508,15 +749,19 @@ class TAG_List(TagIterable):
         self.tagID: int = tagID
         super(TAG_List, self).__init__(*args, **kwargs)
 
-    def deserialize_payload(self, data: memoryview, _unpack=unpack) -> int:
+    def deserialize_payload(self, data: memoryview, offset: int) -> int:
+        return deserialize_nested(self, data, offset)
+
+    def deserialize_payload_header(self, data: memoryview, offset: int) -> Tuple[int, int]:
         self.payload = []
 
         # Determine the tag type; this only gives us the class to instantiate
-        tag_id = data[:1][0]
+        tag_id = data[offset]
         self.tagID = tag_id  # save for serialization
 
         # Determine the eventual number of elements in the list
-        array_size = _unpack("!I", data[1:5])[0]
+        array_size = UINT.unpack_from(data, offset + 1)[0]
+        offset += 1 + self.array_size_width
 
         # Optimization: Don't store a list of Tag instances.
         #
@@ -532,27 +777,37 @@ class TAG_List(TagIterable):
         # The only tags that aren't "primitive" are usually iterables. For
         # example, TAG_List can't be represented using just a Python list
         # type because then information about what type the list is made of
-        # is lost if the list is empty.
+        # is lost if the list is empty. Those are left to deserialize_nested().
         #
         # Note on the size of each tag: They're not known ahead of time. All we
         # know is that we need to append `array_size` tags to the list.
         # Successive offsets into the data are determined by the sum of the
         # sizes of the previously deserialized tags.
-        offset = 1 + self.array_size_width
-        tag_type = TAG_TYPES[tag_id]
+        tag_type = TAG_TYPES_BY_ID[tag_id]
+
         if tag_type._is_primitive:
-            for _ in range(array_size):
-                value, width = tag_type.deserialize_primitive(data[offset:])
-                self.payload.append(value)
+
+            # Lists of numerics are unpacked by a single struct in one call.
+            if tag_type.sformat is not None:
+                self.payload = list(array_struct(tag_type.sformat, array_size).unpack_from(data, offset))
+                return offset + array_size * tag_type.width, 0
+
+            # The number of elements is known, so the list is allocated once
+            # rather than grown by appending.
+            payload = self.payload = [None] * array_size
+            deserialize_primitive = tag_type.deserialize_primitive
+            for index in range(array_size):
+                payload[index], width = deserialize_primitive(data, offset)
                 offset += width
-        else:
-            for _ in range(array_size):
-                tag = tag_type(data[offset:], named=False, tagged=False)
-                self.payload.append(tag)
-                offset += tag._size
-        return offset
+            return offset, 0
+        return offset, array_size
 
     def serialize_payload(self) -> bytes:
+        data = bytearray()
+        self.serialize_payload_into(data)
+        return bytes(data)
+
+    def serialize_payload_into(self, data: bytearray):
         # See the docstring for TAG_List's constructor.
         assert self.tagID is not None or self.payload is not None
 
@@ -562,24 +817,43 @@ class TAG_List(TagIterable):
             self.tagID = self.payload[0].tid
 
         # Serializing the tag type and the number of them is straight-forward.
-        data = b''
-        data += self.tagID.to_bytes(1, byteorder='big', signed=False)
-        data += len(self.payload).to_bytes(self.array_size_width, byteorder='big', signed=False)
+        data += TAG_TYPES_BY_ID[self.tagID]._tid_bytes
+        data += UINT.pack(len(self.payload))
 
         # If the list is empty, there's nothing to serialize :)
         if not self.payload:
-            return data
+            return
 
         # The list has stuff in it. The stuff could be an instance of Tag, or
         # could be primitives (integers, strings, etc).
-        if TAG_TYPES[self.tagID]._is_primitive:
+        tag_type = TAG_TYPES_BY_ID[self.tagID]
+        if tag_type._is_primitive and tag_type.sformat is not None:
+            data += array_struct(tag_type.sformat, len(self.payload)).pack(*self.payload)
+        elif tag_type._is_primitive:
             for primitive in self.payload:
-                data += TAG_TYPES[self.tagID].serialize_primitive(primitive)
+                data += tag_type.serialize_primitive(primitive)
         else:
             for tag in self.payload:
-                data += tag.serialize()
+                tag.serialize_into(data)
 
-        return data
+    def serialized_payload_size(self) -> int:
+        size = 1 + self.array_size_width  # tagID, and the number of elements
+        if not self.payload:
+            return size
+
+        # As in serialize_payload_into(), but without setting self.tagID.
+        if self.tagID is None:
+            tag_type = self.payload[0].__class__
+        else:
+            tag_type = TAG_TYPES_BY_ID[self.tagID]
+        if tag_type._is_primitive and tag_type.sformat is not None:
+            return size + tag_type.width * len(self.payload)
+        elif tag_type._is_primitive:
+            string_size_width = tag_type.string_size_width
+            for primitive in self.payload:
+                size += string_size_width + len(primitive.encode('utf-8'))
+            return size
+        return size + sum(tag.serialized_size() for tag in self.payload)
 
     def validate(self):
         assert isinstance(self.payload, list)
@@ -596,24 +870,27 @@ class TAG_Compound(TagIterable):
 
     tid: int = 0x0a
 
-    def deserialize_payload(self, data: memoryview) -> int:
+    _is_nested: bool = True
+
+    def deserialize_payload(self, data: memoryview, offset: int) -> int:
+        return deserialize_nested(self, data, offset)
+
+    def deserialize_payload_header(self, data: memoryview, offset: int) -> Tuple[int, None]:
         self.payload = []
-        offset = 0
-        while True:
-            tag_id = data[offset:][0]
-            tag = TAG_TYPES[tag_id](data[offset:])
-            offset += tag._size
-            self.payload.append(tag)
-            if isinstance(tag, TAG_End):
-                break
-        return offset
+        return offset, None
 
     def serialize_payload(self) -> bytes:
+        data = bytearray()
+        self.serialize_payload_into(data)
+        return bytes(data)
+
+    def serialize_payload_into(self, data: bytearray):
         assert isinstance(self.payload[-1], TAG_End)
-        data = b''
         for tag in self.payload:
-            data += tag.serialize()
-        return data
+            tag.serialize_into(data)
+
+    def serialized_payload_size(self) -> int:
+        return sum(tag.serialized_size() for tag in self.payload)
 
     def validate(self):
         assert isinstance(self.payload, list)
@@ -623,31 +900,41 @@ class TAG_Compound(TagIterable):
         assert isinstance(self.payload[-1], TAG_End)
 
 
-class TagIterableNumeric(TagIterable):
+@lru_cache(maxsize=64)
+def array_struct(sformat: str, count: int) -> Struct:
+    """ Return a compiled struct for `count` consecutive values of `sformat`
+
+    e.g. ("!i", 3) -> Struct("!3i")
+
+    Packing or unpacking a whole array is then a single call. Arrays of the
+        same size are common (e.g. heightmaps), hence the cache.
+    """
+    return Struct(f"{sformat[0]}{count}{sformat[1:]}")
+
+
+class TagIterableNumeric(TagArray):
     """ Parent-class for lists of numerics
     """
 
     __slots__ = tuple()
 
-    array_size_width: int = 4  # int
-    width: int = None
-
-    def deserialize_payload(self, data: memoryview, _unpack=unpack, _iter_unpack=iter_unpack) -> int:
-        sformat, width = self.sformat, self.width
-        array_size = _unpack("!I", data[:4])[0]
-        last_index = width * array_size
-        self.payload = [i[0] for i in _iter_unpack(sformat, data[4:4 + last_index])]
-        return 4 + last_index
+    # array.array type code with the same width as sformat
+    typecode: str = None
 
-    def serialize_payload(self) -> bytes:
-        data = b''
-        data += len(self.payload).to_bytes(self.array_size_width, byteorder='big', signed=False)
-        for numeric in self.payload:
-            data += numeric.to_bytes(
-                self.width,
-                byteorder='big',
-                signed=True
-            )
+    @classmethod
+    def deserialize_raw(cls, raw: memoryview, _swap: bool = (byteorder == 'little')) -> List[int]:
+        # The whole array is copied & byte-swapped in C, then converted to a
+        # list in one call.
+        values = array(cls.typecode)
+        values.frombytes(raw)
+        if _swap:
+            values.byteswap()
+        return values.tolist()
+
+    def serialize_elements(self, _array_struct=array_struct) -> bytes:
+        array_size = len(self.payload)
+        data: bytes = UINT.pack(array_size)
+        data += _array_struct(self.sformat, array_size).pack(*self.payload)
         return data
 
     def validate(self):
@@ -664,7 +951,8 @@ class TAG_Int_Array(TagIterableNumeric):
 
     tid: int = 0x0b
     width: int = 4  # int
-    sformat = "!i"
+    sformat: str = "!i"
+    typecode: str = "i"
 
 
 class TAG_Long_Array(TagIterableNumeric):
@@ -673,7 +961,8 @@ class TAG_Long_Array(TagIterableNumeric):
 
     tid: int = 0x0c
     width: int = 8  # long
-    sformat = "!q"
+    sformat: str = "!q"
+    typecode: str = "q"
 
 
 # Official "tags" as defined by the spec and Minecraft wiki.
@@ -702,13 +991,100 @@ TAG_TYPES: Dict[int, Tag] = {
     tag_class.tid: tag_class for tag_class in TAGS
 }
 
+# The same mapping as a tuple indexed by tag id. Tag ids are contiguous from
+# zero, and indexing a tuple is cheaper than hashing into TAG_TYPES, which
+# matters in the deserializer's loops.
+TAG_TYPES_BY_ID: Tuple[Tag] = tuple(TAG_TYPES[tid] for tid in range(len(TAG_TYPES)))
 
-def deserialize(nbt_data: memoryview) -> List[Tag]:
-    """ Deserialize NBT data and return a tree
+
+def deserialize_nested(root: TagIterable, data: memoryview, offset: int,
+        _tag_types=TAG_TYPES_BY_ID,
+        _tag_end=TAG_End,
+        _tag_end_singleton=TAG_END_SINGLETON,
+        _new=object.__new__) -> int:
+    """ Deserialize the payload of a TAG_Compound or TAG_List
+
+    Tags nested within the payload are deserialized using an explicit stack
+        rather than by recursion, so the depth of the tree isn't limited by
+        Python's recursion limit and no Python frames are spent per level.
+        Tags that don't contain other tags are deserialized by their
+        deserialize_payload() method.
+
+    The payload of TAG_Compound and TAG_List starts with the result of
+        deserialize_payload_header(): the tag's (empty) payload list is created
+        and, for TAG_List, the type and number of elements are read. The offset
+        after the header and the number of tags that follow are returned. That
+        number is None for TAG_Compound; its tags end at a TAG_End.
+
+    Returns the offset following root's payload.
+    """
+    offset, remaining = root.deserialize_payload_header(data, offset)
+
+    # [tag, offset of the tag's first byte, number of tags remaining]
+    stack = [[root, None, remaining]]
+    push, pop = stack.append, stack.pop
+    while stack:
+        frame = stack[-1]
+        parent, start, remaining = frame
+
+        # TAG_Compound: named & tagged children up to and including TAG_End
+        if remaining is None:
+            tag_type = _tag_types[data[offset]]
+            if tag_type is _tag_end:
+                parent.payload.append(_tag_end_singleton)
+                offset += 1
+                remaining = 0
+            named = tagged = True
+
+        # TAG_List: a known number of nameless, tagless children
+        elif remaining:
+            frame[2] = remaining - 1
+            tag_type = _tag_types[parent.tagID]
+            named = tagged = False
+
+        # The parent's payload is complete. The root's size is set by the
+        # root's deserialize() method.
+        if remaining == 0:
+            pop()
+            if stack:
+                parent._size = offset - start
+            continue
+
+        # The constructor is bypassed; its arguments are only useful when
+        # building tags by hand. Every slot is set below or by the tag's
+        # deserialize_payload() or deserialize_payload_header().
+        #
+        # The header is read inline rather than through deserialize() and
+        # deserialize_header(); children of a compound are always named and
+        # tagged, and children of a list never are.
+        tag = _new(tag_type)
+        tag._named = named
+        tag._tagged = tagged
+        tag_start = offset
+        if named:
+            offset = tag.deserialize_name(data, offset + 1)
+        else:
+            tag.name = ""
+        parent.payload.append(tag)
+        if tag_type._is_nested:
+            offset, tag_remaining = tag.deserialize_payload_header(data, offset)
+            push([tag, tag_start, tag_remaining])
+        else:
+            offset = tag.deserialize_payload(data, offset)
+            tag._size = offset - tag_start
+
+    return offset
+
+
+def deserialize_iter(nbt_data: memoryview) -> Iterator[Tag]:
+    """ Deserialize NBT data and yield each root of the tree as it's deserialized
     """
-    nbt_data = memoryview(nbt_data)  # permit nbt_data to be `bytes`; noop if memoryview
-    nbt_tree = []
+    # Permit nbt_data to be `bytes` (or any other buffer). It's wrapped exactly
+    # once; callers needn't wrap it themselves.
+    if type(nbt_data) is not memoryview:
+        nbt_data = memoryview(nbt_data)
     total_bytes = len(nbt_data)
+    tag_types = TAG_TYPES_BY_ID
 
     # Each iteration of this loop processes one tag at the root of the tree.
     #
@@ -716,62 +1092,226 @@ def deserialize(nbt_data: memoryview) -> List[Tag]:
     # size (in bytes) of the data itself (since the one and only root tag
     # comprises the entire data). If not, the bytes following the tag are
     # considered a new tag.
-    remaining_bytes = total_bytes
-    while remaining_bytes > 0:
+    offset = 0
+    while offset < total_bytes:
 
-        index = total_bytes - remaining_bytes
-        tag_id = nbt_data[index:][0]
-        tag = TAG_TYPES[tag_id](nbt_data[index:])
+        tag = tag_types[nbt_data[offset]](named=True)
+        end = tag.deserialize(nbt_data, offset)
 
         # This assert prevents the while loop from spinning forever in the
         # highly-unlikely event of tag._size being zero or negative (most likely
         # due to a bug).
-        assert tag._size >= 1
+        assert end > offset
 
-        remaining_bytes -= tag._size
-        nbt_tree.append(tag)
+        offset = end
+        yield tag
 
-    return nbt_tree
+
+def deserialize(nbt_data: memoryview) -> List[Tag]:
+    """ Deserialize NBT data and return a tree
+    """
+    return list(deserialize_iter(nbt_data))
+
+
+def skip_payload(data: memoryview, offset: int, tid: int,
+        _tag_types=TAG_TYPES_BY_ID,
+        _ushort_unpack_from=USHORT.unpack_from,
+        _uint_unpack_from=UINT.unpack_from) -> int:
+    """ Return the offset following the payload of a tag with the given id
+
+    The payload starts at `offset` and isn't deserialized; only the lengths
+        needed to find its end are read. Like deserialize_nested(), nested
+        payloads are skipped using an explicit stack rather than by recursion.
+    """
+    # [tag id of the remaining tags (None within a TAG_Compound), number of tags remaining]
+    stack = [[tid, 1]]
+    push, pop = stack.append, stack.pop
+    while stack:
+        frame = stack[-1]
+        tid, remaining = frame
+
+        # TAG_Compound: named & tagged children up to and including TAG_End
+        if tid is None:
+            tid = data[offset]
+            if tid == TAG_End.tid:
+                pop()
+                offset += 1
+                continue
+            offset += 3 + _ushort_unpack_from(data, offset + 1)[0]
+
+        # TAG_List (or the tag being skipped): a known number of payloads
+        elif remaining:
+            frame[1] = remaining - 1
+
+        else:
+            pop()
+            continue
+
+        tag_type = _tag_types[tid]
+        if tag_type is TAG_Compound:
+            push([None, None])
+        elif tag_type is TAG_List:
+            element_type = _tag_types[data[offset]]
+            element_count = _uint_unpack_from(data, offset + 1)[0]
+            offset += 5
+            if element_type._is_primitive and element_type.sformat is not None:
+                offset += element_count * element_type.width
+            elif element_count:
+                push([element_type.tid, element_count])
+        elif tag_type is TAG_String:
+            offset += 2 + _ushort_unpack_from(data, offset)[0]
+        elif tag_type._is_primitive:
+            offset += tag_type.width
+        else:
+            offset += 4 + _uint_unpack_from(data, offset)[0] * tag_type.width
+
+    return offset
+
+
+def _find_path(data: memoryview, offset: int, names: List[bytes]) -> Optional[int]:
+    """ Return the offset of the tag at a path of encoded names, or None
+
+    The path starts at the payload of a TAG_Compound at `offset`.
+    """
+    last = len(names) - 1
+    for depth, name in enumerate(names):
+
+        # Skip the tags in this compound until one with the name is found.
+        while True:
+            tid = data[offset]
+            if tid == TAG_End.tid:
+                return None
+            payload_offset = offset + 3 + USHORT.unpack_from(data, offset + 1)[0]
+            if data[offset + 3:payload_offset] == name:
+                break
+            offset = skip_payload(data, payload_offset, tid)
+
+        if depth == last:
+            return offset
+        if tid != TAG_Compound.tid:
+            return None
+        offset = payload_offset
+
+    return None
+
+
+def deserialize_path(nbt_data: memoryview, path: str) -> Optional[Tag]:
+    """ Deserialize and return only the tag at a path, or None if there's no such tag
+
+    The path is a "/"-separated list of names of nested TAG_Compounds within a
+        root TAG_Compound, ending with the name of the tag, e.g.
+        "Data/Player/Pos" in a level.dat. The payloads of tags that aren't
+        along the path are skipped rather than deserialized.
+    """
+    # Permit nbt_data to be `bytes` (or any other buffer). It's wrapped exactly
+    # once; callers needn't wrap it themselves.
+    if type(nbt_data) is not memoryview:
+        nbt_data = memoryview(nbt_data)
+    names = [name.encode('utf-8') for name in path.split("/")]
+    total_bytes = len(nbt_data)
+
+    offset = 0
+    while offset < total_bytes:
+        tid = nbt_data[offset]
+        payload_offset = offset + 3 + USHORT.unpack_from(nbt_data, offset + 1)[0]
+
+        if tid == TAG_Compound.tid:
+            tag_offset = _find_path(nbt_data, payload_offset, names)
+            if tag_offset is not None:
+                tag = TAG_TYPES_BY_ID[nbt_data[tag_offset]](named=True)
+                tag.deserialize(nbt_data, tag_offset)
+                return tag
+
+        offset = skip_payload(nbt_data, payload_offset, tid)
+
+    return None
 
 
 def serialize(nbt_tree: List[Tag]) -> bytes:
     """ Serialize an NBT tree and return uncompressed bytes
     """
-    data = b''
+    data = bytearray()
     for tag in nbt_tree:
-        data += tag.serialize()
-    return data
+        tag.serialize_into(data)
+    return bytes(data)
 
 
-def extract_serialized_bytes(filename: str) -> bytes:
+def extract_serialized_bytes(filename: str, memory_map: bool = False) -> bytes:
     """ Return uncompressed serialized NBT
+
+    If `memory_map` is true and the file isn't compressed, the file is mapped
+        into memory rather than read, and the mmap is returned. Deserialized
+        arrays keep views of the data they were read from, so the mapping then
+        stays open for as long as the tree does; in particular, the file
+        shouldn't be truncated or overwritten in place while the tree is in
+        use. serialize_file() replaces the file instead, which is safe.
     """
     with open(filename, 'rb') as nbt_file:
-        file_data = nbt_file.read()
 
-    # The file may or may not be compressed. Check for the magic number to know!
-    # https://www.onicos.com/staff/iz/formats/gzip.html
-    if file_data[0:2] == b'\x1f\x8b':
-        import gzip
-        decompressed_data: bytes = gzip.decompress(file_data)
-        return decompressed_data
+        # The file may or may not be compressed. Check for the magic number to know!
+        # https://www.onicos.com/staff/iz/formats/gzip.html
+        magic = nbt_file.read(2)
+        nbt_file.seek(0)
+
+        # Decompress while reading rather than reading the whole compressed file
+        # first; only the decompressed data is ever held in memory in full.
+        if magic == b'\x1f\x8b':
+            if rapidgzip is not None:
+                gzip_file = rapidgzip.open(nbt_file, parallelization=os.cpu_count())
+            else:
+                gzip_file = gzip.open(nbt_file, 'rb')
+            with gzip_file:
+                decompressed_data: bytes = gzip_file.read()
+            return decompressed_data
 
-    return file_data
+        # An empty file can't be mapped.
+        if memory_map and magic:
+            return mmap.mmap(nbt_file.fileno(), 0, access=mmap.ACCESS_READ)
 
+        return nbt_file.read()
 
-def deserialize_file(filename: str) -> List[Tag]:
+
+def deserialize_file(filename: str, memory_map: bool = False) -> List[Tag]:
     """ Deserialize a GZip compressed or uncompressed NBT file
+
+    See extract_serialized_bytes() regarding `memory_map`.
     """
-    serialized_nbt_data = extract_serialized_bytes(filename)
+    serialized_nbt_data = extract_serialized_bytes(filename, memory_map=memory_map)
     return deserialize(serialized_nbt_data)
 
 
 def serialize_file(filename: str, nbt_tree: List[Tag], compress: bool = True):
     """ Serialize an NBT tree, optionally compress the output, and to a file
+
+    Each root tag is written (and compressed) as soon as it's serialized. The
+        serialized tree as a whole is never held in memory.
+
+    The output is written to a temporary file in the same directory, which
+        replaces `filename` only once the whole tree has been written. If
+        serialization fails, an existing file is left as it was. A tree
+        memory-mapped from `filename` (see extract_serialized_bytes()) keeps
+        its mapping of the replaced file, so it can be written back to it.
     """
-    data: bytes = serialize(nbt_tree)
-    if compress:
-        import gzip
-        data = gzip.compress(data)
-    with open(filename, 'wb') as f:
-        f.write(data)
+    directory = os.path.dirname(os.fspath(filename)) or os.curdir
+    nbt_file = tempfile.NamedTemporaryFile(dir=directory, delete=False)
+    try:
+        with nbt_file:
+            out_file = nbt_file
+            if compress:
+                # gzip.open() would take the header's file name from nbt_file.
+                out_file = gzip.GzipFile(filename='', mode='wb', fileobj=nbt_file)
+            with out_file:
+                for tag in nbt_tree:
+                    out_file.write(tag.serialize())
+
+        # The temporary file is only accessible by its owner. Keep the
+        # permissions of the file being replaced, or use the usual ones for a
+        # new file.
+        try:
+            shutil.copymode(filename, nbt_file.name)
+        except FileNotFoundError:
+            os.chmod(nbt_file.name, 0o666 & ~UMASK)
+        os.replace(nbt_file.name, filename)
+    except BaseException:
+        os.remove(nbt_file.name)
+        raise
@@ -5,32 +5,97 @@ https://minecraft.gamepedia.com/Region_file_format
 https://minecraft.gamepedia.com/Anvil_file_format
 """
 
-from collections import defaultdict
+from array import array
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
 # from datetime import datetime
 from enum import IntEnum
+from functools import lru_cache
+from itertools import compress
 import gzip
 from math import ceil
+import mmap
 import os
 import re
-from struct import pack, unpack
-from typing import Dict, List, Optional, Tuple
+from struct import Struct
+from typing import List, Optional, Tuple
 import zlib
 
 from . import nbt
 
 re_coords_from_filename = re.compile(r"r\.([-0-9]+)\.([-0-9]+)\.mc[ar]")
 
+# Compiled structs for the fields of the region header and of each chunk. A
+# chunk's location is a 3 byte sector offset followed by a 1 byte sector count,
+# read together as one unsigned int.
+UINT: Struct = Struct("!I")
+UBYTE: Struct = Struct("!B")
 
+# The size and compression that precede each chunk's data
+CHUNK_HEADER: Struct = Struct("!IB")
+
+# The whole region header: 1024 chunk locations followed by 1024 timestamps
+HEADER: Struct = Struct("!2048I")
+
+# zlib window bits that select a gzip header and trailer
+GZIP_WBITS: int = 16 + zlib.MAX_WBITS
+
+# The number of threads used to decompress chunks when no executor is given.
+# With a single CPU, the chunks are decompressed serially instead; the pool
+# would only add overhead.
+DECOMPRESSION_THREADS: int = os.cpu_count() or 1
+
+
+@lru_cache(maxsize=1024)
 def coords_from_filename(filename: str, rgx=re_coords_from_filename) -> Tuple[int, int]:
-    x, z = rgx.findall(filename)[0]
+    # A region file's basename is "r.<x>.<z>.mca" (or ".mcr"), so the common
+    # case is handled without the regex.
+    parts = filename.split('.')
+    if len(parts) == 4 and parts[0] == 'r' and parts[3] in ('mca', 'mcr'):
+        try:
+            return int(parts[1]), int(parts[2])
+        except ValueError:
+            pass
+    x, z = rgx.search(filename).groups()
     return int(x), int(z)
 
 
+def chunk_index(x: int, z: int) -> int:
+    """ The index of the chunk at offset coordinate (x, z) in a Region's lists
+    """
+    return (z << 5) | x
+
+
 class Compression(IntEnum):
     GZIP = 1
     ZLIB = 2
 
 
+def decompress_chunk_data(chunk_data: bytes, chunk_compression: int) -> bytes:
+    """ Decompress the data of a chunk
+    """
+    if chunk_compression == Compression.GZIP:
+        # Chunks are a single gzip member, which zlib decompresses without
+        # gzip's Python-level header parsing. Anything after the first member
+        # is left to gzip.
+        decompressor = zlib.decompressobj(GZIP_WBITS)
+        decompressed = decompressor.decompress(chunk_data)
+        if decompressor.unused_data or not decompressor.eof:
+            decompressed = gzip.decompress(chunk_data)
+        chunk_data = decompressed
+    elif chunk_compression == Compression.ZLIB:
+        chunk_data = zlib.decompress(chunk_data)
+    return chunk_data
+
+
+def deserialize_chunk_data(chunk_data: bytes, chunk_compression: int) -> List[nbt.Tag]:
+    """ Decompress and deserialize the data of a chunk
+
+    This is a module-level function so that it can be run by a process pool.
+    """
+    return nbt.deserialize(decompress_chunk_data(chunk_data, chunk_compression))
+
+
 class Region:
 
     __slots__ = (
@@ -38,7 +103,7 @@ class Region:
         "_offsets", "_sectors"
     )
 
-    def __init__(self, region_data: memoryview, basename: str = None, x: int = None, z: int = None):
+    def __init__(self, region_data: memoryview, basename: str = None, x: int = None, z: int = None, executor: Executor = None):
         """ Instantiate a McRegion
 
         Regions contain 32x32 chunks.
@@ -55,20 +120,29 @@ class Region:
             x::int
             z::int
                 The optional region coordinates.
+
+            executor::Executor
+                An optional executor (e.g. a ProcessPoolExecutor) used to
+                decompress and deserialize chunks in parallel.
         """
-        # chunks[z][x] -> Chunk or None
+        # chunks[chunk_index(x, z)] -> Chunk or None
         #
         # The coordinates here are the 2-d chunk offset from the top-left of the
         # region. In other words, the chunk's actual coordinates don't matter
         # here. For example, a chunk with coordinate (30, -1) corresponds to
-        # Region(x=0, z=-1).chunks[30][31].
-        self.chunks: Dict[int, Dict[int, Optional[List[nbt.Tag]]]] = defaultdict(lambda: defaultdict(lambda: None))
-        self.timestamps: Dict[int, Dict[int, Optional[int]]] = defaultdict(lambda: defaultdict(int))
-        self.compression: Dict[int, Dict[int, Optional[int]]] = defaultdict(lambda: defaultdict(lambda: None))
+        # Region(x=0, z=-1).chunks[chunk_index(30, 31)].
+        #
+        # Each attribute is a flat, x-major sequence of the region's 32x32
+        # chunks, in the same order as the region's header. The fixed-width
+        # fields are kept in typed arrays (4 KiB or less each) apart from the
+        # chunks' trees.
+        self.chunks: List[Optional[List[nbt.Tag]]] = [None] * 1024
+        self.timestamps: array = array('I', bytes(4 * 1024))
+        self.compression: List[Optional[int]] = [None] * 1024
 
         # Copies of the original values; used for serialization and testing
-        self._offsets: Dict[int, Dict[int, Optional[int]]] = defaultdict(lambda: defaultdict(int))
-        self._sectors: Dict[int, Dict[int, Optional[int]]] = defaultdict(lambda: defaultdict(int))
+        self._offsets: array = array('I', bytes(4 * 1024))
+        self._sectors: array = array('B', bytes(1024))
 
         if basename is not None:
             self.x, self.z = coords_from_filename(basename)
@@ -77,39 +151,45 @@ class Region:
             self.z = z
 
         if region_data is not None:
-            self.deserialize(region_data)
+            self.deserialize(region_data, executor=executor)
 
     def __iter__(self):
-        for z in range(0, 32):
-            for x in range(0, 32):
-                yield self.chunks[z][x]
+        return iter(self.chunks)
 
-    def deserialize_chunk(self, region_data: memoryview, x: int, z: int):
-        """ Deserialize a chunk at offset coordinate (x, z)
+    def deserialize_chunk_header(self, region_data: memoryview, x: int, z: int,
+            location: int = None, timestamp: int = None) -> Optional[Tuple[memoryview, Compression]]:
+        """ Deserialize the metadata of a chunk at offset coordinate (x, z)
 
         This method sets these attributes:
-            self.chunks (nbt trees)
             self.timestamps (as datetime instances)
             self.compression (an enum)
 
-        Chunk sector sizes are computed during serialization.
+        The chunk's location and timestamp are read from the region header
+        unless they're given (e.g. by deserialize(), which reads the whole
+        header at once).
+
+        Returns the chunk's compressed data and its compression, or None if the
+        chunk hasn't been generated.
         """
-        metadata_offset = (128 * z) + (4 * x)
+        index = chunk_index(x, z)
+        metadata_offset = 4 * index
 
         # chunk data offset (3 bytes) and sector count (1 byte)
-        offset_bytes = region_data[metadata_offset:metadata_offset + 3]
-        offset = int.from_bytes(offset_bytes, byteorder='big', signed=False)
-        sectors = region_data[metadata_offset + 3:metadata_offset + 4][0]
-        self._offsets[z][x] = offset
-        self._sectors[z][x] = sectors
+        if location is None:
+            location = UINT.unpack_from(region_data, metadata_offset)[0]
+        offset = location >> 8
+        sectors = location & 0xff
+        self._offsets[index] = offset
+        self._sectors[index] = sectors
 
         if offset == 0 and sectors == 0:
-            return  # ungenerated chunk
+            return None  # ungenerated chunk
 
         # timestamp (4 bytes)
         #   What timezone?... Also, 2038 problem...
-        timestamp_offset = metadata_offset + 4096  # constant 4KiB offset
-        timestamp = unpack("!I", region_data[timestamp_offset:timestamp_offset + 4])[0]
+        if timestamp is None:
+            timestamp_offset = metadata_offset + 4096  # constant 4KiB offset
+            timestamp = UINT.unpack_from(region_data, timestamp_offset)[0]
 
         # TODO
         # chunk_last_update = datetime.fromtimestamp(timestamp)
@@ -117,96 +197,154 @@ class Region:
 
         # Chunk data (4 bytes size, 2 bytes compression, n-bytes compressed data)
         chunk_offset: int = 4 * 1024 * offset  # from start of file, according to the docs
-        chunk_size_bytes: memoryview = region_data[chunk_offset:chunk_offset + 4]
-        chunk_size: int = unpack("!I", chunk_size_bytes)[0]
-        chunk_compression: Compression = Compression(region_data[chunk_offset + 4:chunk_offset + 5][0])
+        chunk_size, chunk_compression = CHUNK_HEADER.unpack_from(region_data, chunk_offset)
+        chunk_compression: Compression = Compression(chunk_compression)
+
+        self.timestamps[index] = chunk_last_update
+        self.compression[index] = chunk_compression
 
-        # Decompression and deserialization
         chunk_data: memoryview = region_data[chunk_offset + 5:chunk_offset + 5 + chunk_size]
-        if chunk_compression == Compression.GZIP:
-            chunk_data = memoryview(gzip.decompress(chunk_data))
-        elif chunk_compression == Compression.ZLIB:
-            chunk_data = memoryview(zlib.decompress(chunk_data))
+        return chunk_data, chunk_compression
+
+    def deserialize_chunk(self, region_data: memoryview, x: int, z: int):
+        """ Deserialize a chunk at offset coordinate (x, z)
+
+        This method sets these attributes:
+            self.chunks (nbt trees)
+            self.timestamps (as datetime instances)
+            self.compression (an enum)
 
-        self.chunks[z][x] = nbt.deserialize(chunk_data)
-        self.timestamps[z][x] = chunk_last_update
-        self.compression[z][x] = chunk_compression
+        Chunk sector sizes are computed during serialization.
+        """
+        chunk_header = self.deserialize_chunk_header(region_data, x, z)
+        if chunk_header is not None:
+            self.chunks[chunk_index(x, z)] = deserialize_chunk_data(*chunk_header)
 
-    def deserialize(self, region_data: memoryview):
+    def deserialize(self, region_data: memoryview, executor: Executor = None):
         """ Find and deserialize all chunks stored in the region
 
         x & z here correspond to the location of the region as provided in the
         filename. Further down, x & z refer to the chunk offset.
+
+        If an executor is given, chunks are decompressed and deserialized by it.
+        Chunks are independent of each other, so with a ProcessPoolExecutor
+        this scales with the number of processes. Otherwise, chunks are
+        decompressed by a pool of threads (zlib releases the GIL while it
+        works) and deserialized by the calling thread. See DECOMPRESSION_THREADS.
         """
-        # Metadata is stored in two x-major matrices.
-        for z in range(0, 32):
-            for x in range(0, 32):
-                self.deserialize_chunk(region_data, x, z)
+        # Metadata is stored in two x-major matrices, which are read in one
+        # call. Chunks that haven't been generated have a location of zero;
+        # they're filtered out in one pass by compress() and never visited.
+        header = HEADER.unpack_from(region_data)
+
+        indexes: List[int] = list(compress(range(0, 1024), header[:1024]))
+        chunk_datas: List[bytes] = []
+        chunk_compressions: List[Compression] = []
+        for index in indexes:
+            location = header[index]
+            z, x = divmod(index, 32)
+            chunk_data, chunk_compression = self.deserialize_chunk_header(
+                region_data, x, z, location, header[1024 + index]
+            )
+            chunk_datas.append(chunk_data)
+            chunk_compressions.append(chunk_compression)
+
+        if executor is None and DECOMPRESSION_THREADS > 1:
+            # Chunks are decompressed at most 2 per thread ahead of the chunk
+            # being deserialized. This keeps the threads busy while bounding
+            # the number of decompressed chunks waiting to be deserialized.
+            max_pending = 2 * DECOMPRESSION_THREADS
+            pending = deque()
+            with ThreadPoolExecutor(max_workers=DECOMPRESSION_THREADS) as decompressor:
+                for index, chunk_data, chunk_compression in zip(indexes, chunk_datas, chunk_compressions):
+                    pending.append((index, decompressor.submit(decompress_chunk_data, chunk_data, chunk_compression)))
+                    if len(pending) == max_pending:
+                        index, decompressed = pending.popleft()
+                        self.chunks[index] = nbt.deserialize(decompressed.result())
+                for index, decompressed in pending:
+                    self.chunks[index] = nbt.deserialize(decompressed.result())
+            return
+
+        if executor is None:
+            for index, chunk_data, chunk_compression in zip(indexes, chunk_datas, chunk_compressions):
+                self.chunks[index] = deserialize_chunk_data(chunk_data, chunk_compression)
+            return
+
+        # A memoryview can't be pickled.
+        chunk_datas = [bytes(chunk_data) for chunk_data in chunk_datas]
+
+        # Submitting chunks in batches amortizes the cost of passing them to
+        # another process. It's ignored by a ThreadPoolExecutor.
+        chunk_trees = executor.map(deserialize_chunk_data, chunk_datas, chunk_compressions, chunksize=32)
+        for index, chunk_tree in zip(indexes, chunk_trees):
+            self.chunks[index] = chunk_tree
 
     def serialize(self) -> bytes:
         """ Return the bytes representation of this region and all contained chunks
         """
-        chunk_bytes: Dict[int, Dict[int, bytearray]] = defaultdict(lambda: defaultdict(lambda: None))
+        chunk_bytes: List[Optional[bytearray]] = [None] * 1024
 
         # 4 KiB sector offset to start of chunk data
-        chunk_sectors_offset: Dict[int, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        chunk_sectors_offset: List[int] = [0] * 1024
 
         # Number of 4 KiB sectors spanned
-        chunk_sectors_spanned: Dict[int, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        chunk_sectors_spanned: List[int] = [0] * 1024
 
         # Chunk serialization and compression
         next_offset = 2  # in 4 KiB sectors
-        for z in range(0, 32):
-            for x in range(0, 32):
-                if self.chunks[z][x] is not None:
-                    chunk_sectors_offset[z][x] = next_offset
-                    serialized_chunk_data: bytes = nbt.serialize(self.chunks[z][x])
-
-                    # Compress the serialized data, reusing the reference
-                    chunk_compression = Compression(self.compression[z][x])
-                    if chunk_compression == Compression.ZLIB:
-                        serialized_chunk_data: bytes = zlib.compress(serialized_chunk_data)
-                    elif chunk_compression == Compression.GZIP:
-                        serialized_chunk_data: bytes = gzip.compress(serialized_chunk_data)
-
-                    # Compute and save the number of sectors required to store the chunk
-                    chunk_size: int = 5 + len(serialized_chunk_data)
-                    chunk_span: int = ceil(chunk_size / 4096)
-                    next_offset += chunk_span
-                    chunk_sectors_spanned[z][x]: int = chunk_span
-
-                    # Pre-allocate the space required to store the chunk (0-filled)
-                    chunk_data = bytearray(chunk_span * 4096)
-
-                    chunk_data[:4] = pack("!I", chunk_size)
-                    chunk_data[4:5] = pack("!B", chunk_compression)
-                    chunk_data[5:5 + len(serialized_chunk_data)] = serialized_chunk_data
-
-                    chunk_bytes[z][x] = chunk_data
-                    assert len(chunk_bytes[z][x]) == chunk_span * 4096
+        for index in range(0, 1024):
+            if self.chunks[index] is not None:
+                chunk_sectors_offset[index] = next_offset
+                serialized_chunk_data: bytes = nbt.serialize(self.chunks[index])
+
+                # Compress the serialized data, reusing the reference
+                chunk_compression = Compression(self.compression[index])
+                if chunk_compression == Compression.ZLIB:
+                    serialized_chunk_data: bytes = zlib.compress(serialized_chunk_data)
+                elif chunk_compression == Compression.GZIP:
+                    serialized_chunk_data: bytes = gzip.compress(serialized_chunk_data)
+
+                # Compute and save the number of sectors required to store the chunk
+                chunk_size: int = 5 + len(serialized_chunk_data)
+                chunk_span: int = ceil(chunk_size / 4096)
+                next_offset += chunk_span
+                chunk_sectors_spanned[index] = chunk_span
+
+                # Pre-allocate the space required to store the chunk (0-filled)
+                chunk_data = bytearray(chunk_span * 4096)
+
+                chunk_data[:4] = UINT.pack(chunk_size)
+                chunk_data[4:5] = UBYTE.pack(chunk_compression)
+                chunk_data[5:5 + len(serialized_chunk_data)] = serialized_chunk_data
+
+                chunk_bytes[index] = chunk_data
+                assert len(chunk_bytes[index]) == chunk_span * 4096
 
         # Metadata (offsets, spans, timestamps) serialization
         metadata: bytearray = bytearray(4096)
         timestamps: bytearray = bytearray(4096)
-        for z in range(0, 32):
-            for x in range(0, 32):
-                metadata_offset = (128 * z) + (4 * x)
-                metadata[metadata_offset + 0:metadata_offset + 3] = chunk_sectors_offset[z][x].to_bytes(3, byteorder='big', signed=False)
-                metadata[metadata_offset + 3:metadata_offset + 4] = pack("!B", chunk_sectors_spanned[z][x])
-                timestamps[metadata_offset:metadata_offset + 4] = pack("!I", self.timestamps[z][x])
+        for index in range(0, 1024):
+            metadata_offset = 4 * index
+            UINT.pack_into(metadata, metadata_offset, chunk_sectors_offset[index] << 8)
+            UBYTE.pack_into(metadata, metadata_offset + 3, chunk_sectors_spanned[index])
+            UINT.pack_into(timestamps, metadata_offset, self.timestamps[index])
 
         packed_chunk_data: bytearray = bytearray()
-        for z in range(0, 32):
-            for x in range(0, 32):
-                if chunk_bytes[z][x] is not None:
-                    packed_chunk_data += chunk_bytes[z][x]
+        for chunk_data in chunk_bytes:
+            if chunk_data is not None:
+                packed_chunk_data += chunk_data
 
         return metadata + timestamps + packed_chunk_data
 
 
-def deserialize_file(filename: str) -> Region:
-    with open(filename, 'rb') as f:
-        region_data = f.read()
+def deserialize_file(filename: str, executor: Executor = None) -> Region:
+    """ Deserialize a region file
+
+    The file is mapped into memory rather than read. Slicing an mmap copies,
+    so only the header fields and each chunk's compressed data are read from
+    it, and nothing refers to the mapping once it's closed.
+    """
     region_basename = os.path.basename(filename)
-    r = Region(region_data=region_data, basename=region_basename)
+    with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as region_data:
+        r = Region(region_data=region_data, basename=region_basename, executor=executor)
     return r
@@ -2,7 +2,11 @@
 """ Navigate an NBT file
 """
 
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import os
 import sys
+from typing import Any, Iterable, List, Tuple
 
 import aPyNBT.nbt as nbt
 import aPyNBT.region as region
@@ -10,87 +14,178 @@ import aPyNBT.region as region
 line_template = "{:<32} {:>3} {:>5}B {:>24} = {}"
 max_values_per_line = 16
 
+# Lines are written to stdout in batches of this many rather than printed one
+# at a time.
+lines_per_write = 1024
 
-def print_nbt(tree, level: int = 0, parent: nbt.Tag = None):
+# print_nbt() dispatches on the exact type of each branch rather than walking
+# the class hierarchy with isinstance().
+tag_types = frozenset(nbt.TAGS)
+multi_value_types = frozenset((nbt.TAG_Byte_Array, nbt.TAG_Int_Array, nbt.TAG_Long_Array))
+
+# The names of tag types, and the sizes printed for elements of a TAG_List, by
+# tag id
+tag_type_names = tuple(tag_class.__name__ for tag_class in nbt.TAG_TYPES_BY_ID)
+tag_type_widths = tuple(str(getattr(tag_class, "width", None)) for tag_class in nbt.TAG_TYPES_BY_ID)
+
+
+def print_end(tag: nbt.TAG_End) -> Tuple[str, None]:
+    return "", None
+
+
+def print_primitive(tag: nbt.Tag) -> Tuple[Any, None]:
+    return tag.payload, None
+
+
+def print_iterable(tag: nbt.TagIterable) -> Tuple[str, Iterable]:
+    return f"{len(tag.payload)} children", tag.payload
+
+
+def print_list(tag: nbt.TAG_List) -> Tuple[str, Iterable]:
+    return f"{len(tag.payload)} children of type {tag_type_names[tag.tagID]}", tag.payload
+
+
+# For each tag id, a function that returns the value printed for a tag of the
+# type and the branches printed below it (or None). Iterable tags describe
+# their payload rather than print it.
+tag_printers = tuple(
+    print_end if tag_class is nbt.TAG_End else
+    print_list if tag_class is nbt.TAG_List else
+    print_iterable if issubclass(tag_class, nbt.TagIterable) else
+    print_primitive
+    for tag_class in nbt.TAG_TYPES_BY_ID
+)
+
+
+@lru_cache(maxsize=None)
+def level_line_template(level: int) -> str:
+    """ line_template with the level's padding built into the type column
+
+    The padded type column is formatted without first concatenating the
+        padding and the type.
+    """
     padding = "  " * level
+    type_width = max(32 - len(padding), 1)
+    return padding + line_template.replace("{:<32}", "{:<%d}" % type_width, 1)
+
+
+def write_lines(lines: List[str]):
+    """ Write the lines to stdout and empty the list """
+    if lines:
+        sys.stdout.write("\n".join(lines) + "\n")
+        lines.clear()
 
-    name = "unknown"
-    value = "unknown"
-    size = "unknown"
-    tagtype = "unknown"
 
-    # If the parent tag type is expected to store a huge number of primitives,
-    # then print multiple elements per line.
-    multi_values_per_line = isinstance(parent, (nbt.TAG_Byte_Array, nbt.TAG_Int_Array, nbt.TAG_Long_Array))
-    values = None
+class PrintFrame:
+    """ The state of print_nbt() within the branches of one tree (or subtree) """
 
-    if multi_values_per_line:
-        name = ""
-        size = ""
+    __slots__ = (
+        "branches", "level", "parent", "template", "multi_values_per_line",
+        "parent_is_list", "name", "size", "tagtype", "values", "branch"
+    )
 
-    for branch in tree:
+    def __init__(self, tree, level: int, parent: nbt.Tag):
+        self.branches = iter(tree)
+        self.level = level
+        self.parent = parent
+        self.template = level_line_template(level)
 
-        if isinstance(branch, nbt.Tag):
+        # If the parent tag type is expected to store a huge number of
+        # primitives, then print multiple elements per line.
+        parent_type = type(parent)
+        self.multi_values_per_line = parent_type in multi_value_types
+        self.parent_is_list = parent_type is nbt.TAG_List
 
-            size = str(branch._size)
-            tagtype = str(nbt.TAG_TYPES[branch.tid].__name__)
+        self.name = "unknown"
+        self.size = "unknown"
+        self.tagtype = "unknown"
+        self.values = None
+        self.branch = None
+
+        if self.multi_values_per_line:
+            self.name = ""
+            self.size = ""
+
+
+def print_nbt(tree, level: int = 0, parent: nbt.Tag = None):
+    lines = []
+
+    # The tree is walked depth-first with an explicit stack of frames rather
+    # than by recursion. The branches of a branch are printed (by pushing a
+    # frame for them) before the branch's next sibling.
+    stack = [PrintFrame(tree, level, parent)]
+    push, pop = stack.append, stack.pop
+    while stack:
+        frame = stack[-1]
+        branch = next(frame.branches, frame)  # the frame itself marks the end
+        if branch is frame:
+            pop()
+            if frame.values:
+                tagtype = str(type(frame.branch))
+                value = ' '.join(frame.values)
+                line = frame.template.format(tagtype, frame.level, frame.size, frame.name, value)
+                lines.append(line)
+            continue
+        frame.branch = branch
+
+        branch_type = type(branch)
+        is_tag = branch_type in tag_types
+
+        if is_tag:
+
+            frame.size = str(branch._size)
+            frame.tagtype = branch_type.__name__
 
             # name
             if branch.name is not None:
-                name = branch.name
-            elif isinstance(parent, nbt.TAG_List):
-                name = ""  # TAG_List stores unnamed tags
+                frame.name = branch.name
+            elif frame.parent_is_list:
+                frame.name = ""  # TAG_List stores unnamed tags
 
             # value (typically the payload or meta about an iterable)
-            if isinstance(branch, nbt.TAG_End):
-                name = ""
-                value = ""
-            elif isinstance(branch, nbt.TagIterable):
-                value = f"{len(branch.payload)} children"
-                if isinstance(branch, nbt.TAG_List):
-                    value += f" of type {nbt.TAG_TYPES[branch.tagID].__name__}"
-            else:
-                value = str(branch.payload)
+            value, subtree = tag_printers[branch.tid](branch)
+            if branch_type is nbt.TAG_End:
+                frame.name = ""
 
         # Print multiple elements per-line
-        elif multi_values_per_line:
-            if values is None:
-                values = []
-            values.append("{:>3}".format(branch))
-            if len(values) == max_values_per_line:
-                tagtype = str(type(branch))
-                value = ' '.join(values)
-                line = line_template.format(f"{padding}{tagtype}", level, size, name, value)
-                print(line)
-                values = None
+        elif frame.multi_values_per_line:
+            if frame.values is None:
+                frame.values = []
+            frame.values.append("{:>3}".format(branch))
+            if len(frame.values) == max_values_per_line:
+                frame.tagtype = str(branch_type)
+                value = ' '.join(frame.values)
+                line = frame.template.format(frame.tagtype, frame.level, frame.size, frame.name, value)
+                lines.append(line)
+                frame.values = None
             continue
 
         # Primitive types
         else:
-            tagtype = str(type(branch))
-            name = ""
+            frame.tagtype = str(branch_type)
+            frame.name = ""
             value = branch
 
-            if isinstance(branch, str):
-                size = str(len(branch))
-            elif isinstance(parent, nbt.TAG_List):
-                size = str(nbt.TAG_TYPES[parent.tagID].width)
+            if branch_type is str:
+                frame.size = str(len(branch))
+            elif frame.parent_is_list:
+                frame.size = tag_type_widths[frame.parent.tagID]
 
-        line = line_template.format(f"{padding}{tagtype}", level, size, name, value)
-        print(line)
+        line = frame.template.format(frame.tagtype, frame.level, frame.size, frame.name, value)
+        lines.append(line)
+        if len(lines) >= lines_per_write:
+            write_lines(lines)
 
-        # Then print the branches of the branch:
-        if isinstance(branch, nbt.Tag) and hasattr(branch.payload, "__iter__"):
-            if not isinstance(branch.payload, str):
-                print_nbt(branch.payload, level + 1, branch)
-        elif hasattr(branch, "__iter__"):
-            print_nbt(branch, level + 1, None)
+        # Then print the branches of the branch. Apart from tags, only lists
+        # (e.g. a region's chunks) have branches; the other values in a
+        # payload are ints, floats and strings.
+        if is_tag:
+            if subtree is not None:
+                push(PrintFrame(subtree, frame.level + 1, branch))
+        elif branch_type is list:
+            push(PrintFrame(branch, frame.level + 1, None))
 
-    if values:
-        tagtype = str(type(branch))
-        value = ' '.join(values)
-        line = line_template.format(f"{padding}{tagtype}", level, size, name, value)
-        print(line)
+    write_lines(lines)
 
 
 def print_nbt_file(filename: str):
@@ -98,7 +193,13 @@ def print_nbt_file(filename: str):
 
     # Region/Anvil or pure NBT (compressed or not) accepted
     if filename.endswith(".mcr") or filename.endswith(".mca"):
-        r = region.deserialize_file(filename)
+        # Chunks are parsed in parallel by a pool of processes; parsing is pure
+        # Python and holds the GIL, so threads wouldn't help.
+        if (os.cpu_count() or 1) > 1:
+            with ProcessPoolExecutor() as executor:
+                r = region.deserialize_file(filename, executor=executor)
+        else:
+            r = region.deserialize_file(filename)
         print(f"REGION {r.x} {r.z} stores {len(list(r))} chunks")
         tree = r  # __iter__() generator that yields chunks
     else:
@@ -2,13 +2,17 @@
 """ pytest configuration
 """
 
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
 import hashlib
+import os
 from pathlib import Path
 import pickle
 import random
 import re
 import time
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, FrozenSet, Iterator, List, Optional, Tuple
+import zlib
 
 import line_profiler
 import _line_profiler
@@ -25,28 +29,60 @@ ANVIL_FILE_SUFFIXES: Tuple[str] = (".mca",)
 REGION_FILE_SUFFIXES: Tuple[str] = (".mcr",)
 
 # These files will be ignored:
-TEST_FILE_BLACKLIST: Tuple[str] = (
+TEST_FILE_BLACKLIST: FrozenSet[str] = frozenset((
     "uid.dat",  # Undocumented. Maybe related to Realms?
                 # https://www.minecraftforum.net/forums/minecraft-java-edition/suggestions/79149-world-uid-for-multi-world-servers
-)
+))
 
 PROFILING_PUBLIC_DIR = Path("perf/Public/")
 PROFILING_PRIVATE_DIR = Path("perf/Private/")
 
+# Profiles are saved under their test's name, with characters that may not be
+# safe in a filename replaced; what's left is ASCII. Hashed names
+# (--public-profiling) are this many bytes of a blake2b digest.
+PROFILE_NAME_UNSAFE_RE = re.compile(r"[^-a-zA-Z0-9_\.]")
+PROFILE_NAME_DIGEST_SIZE = 3
+PROFILE_NAME_HASH = partial(hashlib.blake2b, digest_size=PROFILE_NAME_DIGEST_SIZE)
+
+
+def _nbt_function(name: str) -> Callable:
+    """ The function in nbt named e.g. "deserialize" or "TAG_List.serialize_payload_into"
+    """
+    function = nbt
+    for attribute in name.strip().split("."):
+        function = getattr(function, attribute)
+    return getattr(function, "__func__", function)  # unbind class methods
+
 
 def _find_all_test_data(root: Path, exts: Tuple[str] = None) -> List[Path]:
     """ Search and return testable files based on suffix
+
+    Directories are traversed in sorted order, so similar files (e.g. player
+        data) are tested back-to-back, in the same order on every run.
+
+    os.scandir() is used rather than Path.iterdir(); the type of each entry is
+        known from reading the directory, without a stat() per entry. The tree
+        is walked with a stack of directory listings rather than by recursion,
+        and a Path is only created for files that are kept.
     """
+    def _sorted_entries(path) -> Iterator[os.DirEntry]:
+        with os.scandir(path) as it:
+            return iter(sorted(it, key=lambda entry: entry.name))
+
     files = []
-    for f in root.iterdir():
-        if f.is_dir():
-            files.extend(_find_all_test_data(f, exts=exts))
+    stack = [_sorted_entries(root)]
+    while stack:
+        entry = next(stack[-1], None)
+        if entry is None:
+            stack.pop()
             continue
-        if f.is_file():
-            if any([f.name.endswith(suffix) for suffix in exts]):
-                if f.name not in TEST_FILE_BLACKLIST:
-                    files.append(f)
-                    continue
+        if entry.is_dir():
+            stack.append(_sorted_entries(entry.path))
+            continue
+        if entry.is_file():
+            if entry.name.endswith(exts):
+                if entry.name not in TEST_FILE_BLACKLIST:
+                    files.append(Path(entry.path))
     return files
 
 
@@ -62,19 +98,25 @@ REGION_FILEPATH_IDS: List[str] = None
 def pytest_addoption(parser):
     g = parser.getgroup("aPyNBT Test Control")
     g.addoption("--shuffle-files", action="store_true", dest="shuffle-files", help="Shuffle lists of files")
+    g.addoption("--largest-files-first", action="store_true", dest="largest-files-first", help="Test the largest files first (e.g. to balance pytest-xdist workers)")
     g.addoption("--repeat-files", action="store", type=int, default=1, dest="repeat-files", help="Number of times to test all files")
     g.addoption("--limit-nbt-files", action="store", type=int, default=-1, dest="limit-nbt-files", help="Cap the number of data files used for testing (nbt)")
     g.addoption("--limit-region-files", action="store", type=int, default=8, dest="limit-region-files", help="Cap the number of data files used for testing (region)")
     g.addoption("--limit-anvil-files", action="store", type=int, default=8, dest="limit-anvil-files", help="Cap the number of data files used for testing (anvil)")
     g.addoption("--file-ids", action="store_true", dest="file-ids", help="Don't create test IDs out of filenames")
     g.addoption("--nbt-profiling", action="store_true", dest="nbt-profiling", help="Profile the nbt module during unit test execution")
+    g.addoption("--profile-functions", action="store", type=str, default=None, dest="profile-functions", help="Only profile these nbt functions (comma-separated, e.g. deserialize_nested,TAG_String.deserialize_primitive)")
+    g.addoption("--aggregate-flush-every", action="store", type=int, default=0, dest="aggregate-flush-every", help="Also save the aggregate profiling stats after every N profiled tests")
     g.addoption("--public-profiling", action="store_true", dest="public-profiling", help="Save per-test prof data named as hashed test parameter ids")
     g.addoption("--pertest-profiling", action="store_true", dest="pertest-profiling", help="Save prof data for each test & parameter combination")
+    g.addoption("--skip-reserialized", action="store_true", dest="skip-reserialized", help="Don't reserialize files that reserialized correctly in a previous run with the same nbt.py")
     g.addoption("--test-data-dir", action="store", type=str, default=None, dest="test-data-dir", help="Search for NBT/Region files in this directory")
 
 
 PROFILING_NBT = False
 PUBLIC_PROFILING = False
+AGGREGATE_FLUSH_EVERY = 0
+PROFILED_FUNCTIONS: List[Callable] = None  # None: all of nbt
 
 
 def pytest_configure(config):
@@ -82,7 +124,8 @@ def pytest_configure(config):
         NBT_FILEPATH_FILES, NBT_FILEPATH_IDS, \
         ANVIL_FILEPATH_FILES, ANVIL_FILEPATH_IDS, \
         REGION_FILEPATH_FILES, REGION_FILEPATH_IDS, \
-        PERTEST_PROFILING, PROFILING_NBT, PUBLIC_PROFILING
+        PERTEST_PROFILING, PROFILING_NBT, PUBLIC_PROFILING, AGGREGATE_FLUSH_EVERY, \
+        PROFILED_FUNCTIONS
 
     NBT_FILEPATH_FILES = []
     ANVIL_FILEPATH_FILES = []
@@ -102,6 +145,14 @@ def pytest_configure(config):
         except FileExistsError:
             pass
 
+    # --profile-functions
+    profile_functions = config.getoption("profile-functions")
+    if profile_functions is not None:
+        PROFILED_FUNCTIONS = [_nbt_function(name) for name in profile_functions.split(",")]
+
+    # --aggregate-flush-every
+    AGGREGATE_FLUSH_EVERY = config.getoption("aggregate-flush-every")
+
     # --public-profiling
     PUBLIC_PROFILING = config.getoption("public-profiling")
 
@@ -110,20 +161,24 @@ def pytest_configure(config):
 
     # --test-data-dir
     test_data_root = DEFAULT_TEST_DATA_PATH
-    if config.getoption("test-data-dir") is not None:
-        test_data_root = Path(config.getoption("test-data-dir"))
-
-    # Find files to use as test parameters
-    NBT_FILEPATH_FILES = _find_all_test_data(root=test_data_root, exts=NBT_FILE_SUFFIXES)
-    ANVIL_FILEPATH_FILES = _find_all_test_data(root=test_data_root, exts=ANVIL_FILE_SUFFIXES)
-    REGION_FILEPATH_FILES = _find_all_test_data(root=test_data_root, exts=REGION_FILE_SUFFIXES)
+    test_data_dir = config.getoption("test-data-dir")
+    if test_data_dir is not None:
+        test_data_root = Path(test_data_dir)
+
+    # Find files to use as test parameters. The test data directory is walked
+    # once for all kinds of files.
+    test_data_files = _find_all_test_data(
+        root=test_data_root,
+        exts=NBT_FILE_SUFFIXES + ANVIL_FILE_SUFFIXES + REGION_FILE_SUFFIXES
+    )
+    NBT_FILEPATH_FILES = [f for f in test_data_files if f.name.endswith(NBT_FILE_SUFFIXES)]
+    ANVIL_FILEPATH_FILES = [f for f in test_data_files if f.name.endswith(ANVIL_FILE_SUFFIXES)]
+    REGION_FILEPATH_FILES = [f for f in test_data_files if f.name.endswith(REGION_FILE_SUFFIXES)]
 
     # --repeat-files
-    if config.getoption("repeat-files") > 0:
-        nbt_filepath_files = []
-        for _ in range(config.getoption("repeat-files")):
-            nbt_filepath_files.extend(NBT_FILEPATH_FILES)
-        NBT_FILEPATH_FILES = nbt_filepath_files
+    repeat_files = config.getoption("repeat-files")
+    if repeat_files > 0:
+        NBT_FILEPATH_FILES = NBT_FILEPATH_FILES * repeat_files
 
     # --shuffle-files
     if config.getoption("shuffle-files"):
@@ -148,95 +203,314 @@ def pytest_configure(config):
     if max_region_files >= 0:
         REGION_FILEPATH_FILES = REGION_FILEPATH_FILES[:max_region_files]
 
+    # --largest-files-first
+    if config.getoption("largest-files-first"):
+        # Longest processing time first: when tests are spread over several
+        # workers (pytest -n auto), the largest files are started early rather
+        # than left to hold up the end of the run. Files are still chosen by
+        # the limits above.
+        for filepath_files in (NBT_FILEPATH_FILES, ANVIL_FILEPATH_FILES, REGION_FILEPATH_FILES):
+            filepath_files.sort(key=lambda filepath: filepath.stat().st_size, reverse=True)
+
     # --file-ids
     if config.getoption("file-ids"):
-        NBT_FILEPATH_IDS = [str(nbt_filepath) for nbt_filepath in NBT_FILEPATH_FILES]
-        ANVIL_FILEPATH_IDS = [str(anvil_filepath) for anvil_filepath in ANVIL_FILEPATH_FILES]
-        REGION_FILEPATH_IDS = [str(region_filepath) for region_filepath in REGION_FILEPATH_FILES]
+        NBT_FILEPATH_IDS = list(map(os.fspath, NBT_FILEPATH_FILES))
+        ANVIL_FILEPATH_IDS = list(map(os.fspath, ANVIL_FILEPATH_FILES))
+        REGION_FILEPATH_IDS = list(map(os.fspath, REGION_FILEPATH_FILES))
 
 
 CURRENT_TIME = int(time.time() * 1000)
-AGGREGATE_STATS = None
+# The line timings of every profiled test, merged:
+#   (filename, first line number, function name) -> line number -> [hit count, total time]
+AGGREGATE_TIMINGS: Dict[Tuple[str, int, str], Dict[int, List[int]]] = {}
+
+# The stats of the most recently profiled test, and the number of tests profiled
+LAST_STATS: _line_profiler.LineStats = None
+PROFILED_TESTS = 0
 
 
-def merge_line_stats(base: _line_profiler.LineStats, incr: _line_profiler.LineStats) -> None:
+def merge_line_stats(base: Dict[Tuple[str, int, str], Dict[int, List[int]]], incr: _line_profiler.LineStats) -> None:
     """ base += incr
 
     LineStats.timings: Dict[Tuple[str, str, str], List[Tuple[const int, int, int]]]
+
+    The merged timings are kept by line number, so each test's timings are
+        added in place rather than rebuilding and re-sorting every function's
+        list of lines. See aggregate_line_stats().
     """
     # key -> (filename, first line number, function name)
     # value -> [(line number, hit count, total time), ...]
     for key, new_values in incr.timings.items():
+        line_timings = base.get(key)
+        if line_timings is None:
+            line_timings = base[key] = {}
+        for lineno, hits, tottime in new_values:
+            line_timing = line_timings.get(lineno)
+            if line_timing is None:
+                line_timings[lineno] = [hits, tottime]
+            else:
+                line_timing[0] += hits
+                line_timing[1] += tottime
+
+
+def aggregate_line_stats(timings: Dict[Tuple[str, int, str], Dict[int, List[int]]], stats: _line_profiler.LineStats) -> _line_profiler.LineStats:
+    """ Merged timings as a LineStats of the same type and unit as `stats`
+    """
+    return type(stats)({
+        key: [(lineno, hits, tottime) for lineno, (hits, tottime) in sorted(line_timings.items())]
+        for key, line_timings in timings.items()
+    }, stats.unit)
 
-        if key not in base.timings:
-            base.timings[key] = incr.timings[key]
-            continue
-
-        line_to_hits: Dict[int, int] = {}
-        line_to_time: Dict[int, int] = {}
-
-        for base_value in base.timings[key]:
-            lineno, hits, tottime = base_value
-            line_to_hits[lineno] = hits
-            line_to_time[lineno] = tottime
-
-        for new_value in new_values:
-            lineno, hits, tottime = new_value
-            if lineno in line_to_hits.keys():
-                line_to_hits[lineno] += hits
-                line_to_time[lineno] += tottime
-                continue
-            line_to_hits[lineno] = hits
-            line_to_time[lineno] = tottime
 
-        base.timings[key] = []
-        for lineno in sorted(list(line_to_hits.keys())):
-            base.timings[key].append((lineno, line_to_hits[lineno], line_to_time[lineno]))
+def save_aggregate_stats() -> None:
+    """ Save the aggregate profiling stats to the Public/ directory
+    """
+    aggregate_stats = aggregate_line_stats(AGGREGATE_TIMINGS, LAST_STATS)
+    with open(PROFILING_PUBLIC_DIR / f"aggregate.prof", 'wb') as f:
+        pickle.dump(aggregate_stats, f, pickle.HIGHEST_PROTOCOL)
+    with open(PROFILING_PUBLIC_DIR / f"aggregate.stats", 'w') as f:
+        line_profiler.show_text(aggregate_stats.timings, aggregate_stats.unit, stream=f)
 
 
 @pytest.hookimpl(hookwrapper=True)
-def pytest_runtest_protocol(item, nextitem):
+def pytest_runtest_call(item):
+    """ Profile the test's call phase; setup and teardown (e.g. of fixtures)
+    aren't profiled. Skipped tests have no call phase.
+    """
     if not PROFILING_NBT:
         yield
         return
 
     lp = line_profiler.LineProfiler()
-    lp.add_module(nbt)
+    if PROFILED_FUNCTIONS is None:
+        lp.add_module(nbt)
+    else:
+        for function in PROFILED_FUNCTIONS:
+            lp.add_function(function)
     lp.enable_by_count()
     yield
     lp.disable_by_count()
 
-    # All private profiling results are compiled and saved into one statistic.
-    # This singular statistic is saved in the Public/ directory.
-    global AGGREGATE_STATS
-    if AGGREGATE_STATS is None:
-        AGGREGATE_STATS = lp.get_stats()
-    else:
-        merge_line_stats(AGGREGATE_STATS, lp.get_stats())
-    with open(PROFILING_PUBLIC_DIR / f"aggregate.prof", 'wb') as f:
-        pickle.dump(AGGREGATE_STATS, f, pickle.HIGHEST_PROTOCOL)
-    with open(PROFILING_PUBLIC_DIR / f"aggregate.stats", 'w') as f:
-        line_profiler.show_text(AGGREGATE_STATS.timings, AGGREGATE_STATS.unit, stream=f)
+    # All private profiling results are compiled into one statistic, which is
+    # saved in the Public/ directory at the end of the session (and every
+    # --aggregate-flush-every tests).
+    global LAST_STATS, PROFILED_TESTS
+    LAST_STATS = lp.get_stats()
+    merge_line_stats(AGGREGATE_TIMINGS, LAST_STATS)
+    PROFILED_TESTS += 1
+    if AGGREGATE_FLUSH_EVERY > 0 and PROFILED_TESTS % AGGREGATE_FLUSH_EVERY == 0:
+        save_aggregate_stats()
 
     # Profiling results will always have individual entries in the Private/
     # directory. Item name hashing and saving to the public directory can be
     # enabled with --public-profiling.
     if not PERTEST_PROFILING:
         return
-    profile_name = re.sub(r"[^-a-zA-Z0-9_\.]", "_", item.name)
+    profile_name = PROFILE_NAME_UNSAFE_RE.sub("_", item.name)
     lp.dump_stats(PROFILING_PRIVATE_DIR / f"{profile_name}.prof")
     with open(PROFILING_PRIVATE_DIR / f"{profile_name}.stats", 'w') as f:
         lp.print_stats(stream=f)
     if PUBLIC_PROFILING:
-        profile_name_hashed = hashlib.blake2b(
-            profile_name.encode('utf-8'),
-            digest_size=3
-        ).hexdigest()
+        profile_name_hashed = PROFILE_NAME_HASH(profile_name.encode('ascii')).hexdigest()
         lp.dump_stats(PROFILING_PUBLIC_DIR / f"{profile_name_hashed}.prof")
         with open(PROFILING_PUBLIC_DIR / f"{profile_name_hashed}.stats", 'w') as f:
             lp.print_stats(stream=f)
 
 
+# zlib window bits that select a gzip header and trailer
+GZIP_WBITS: int = 16 + zlib.MAX_WBITS
+
+
+def read_serialized_bytes(filepath: Path) -> bytes:
+    """ nbt.extract_serialized_bytes(), with the whole file inflated at once
+
+    Test data files are small enough to read whole, and zlib inflates them
+    in one call much faster than a GzipFile does in chunks. The library
+    streams instead, to bound its memory use.
+    """
+    data = filepath.read_bytes()
+    if data[:2] != b'\x1f\x8b':
+        return data  # uncompressed
+    members: List[bytes] = []
+    while data:
+        decompressor = zlib.decompressobj(GZIP_WBITS)
+        members.append(decompressor.decompress(data))
+        if not decompressor.eof:
+            raise EOFError(f"{filepath}: gzip data ended before the end-of-stream marker")
+        data = decompressor.unused_data
+    return b"".join(members)
+
+
+# The NBT test data file used by each collected test that reads one through
+# the serialized_bytes or deserialized_tree fixtures, by node ID, and the
+# number of those tests per file. See pytest_collection_modifyitems().
+NBT_FILE_TESTS: Dict[str, Path] = {}
+NBT_FILE_USES: Dict[Path, int] = {}
+
+# How many NBT test data files are read ahead of the tests that use them
+NBT_FILE_PREFETCH = 2 * (os.cpu_count() or 1)
+
+# The session's NBTTestData, while the nbt_test_data fixture is set up
+NBT_TEST_DATA: Optional["NBTTestData"] = None
+
+
+class NBTTestData:
+    """ The serialized bytes and trees of NBT test data files, for the session
+
+    Files are read on a pool of threads (zlib releases the GIL) a bounded
+        window ahead of the tests that use them, in the order those tests
+        run. A file's bytes and tree are dropped once the last test that
+        uses the file has run.
+
+    Files without counted uses (see pytest_collection_modifyitems()) are
+        read when they're first asked for and kept for the session.
+    """
+
+    def __init__(self, executor: ThreadPoolExecutor, uses: Dict[Path, int], prefetch: int):
+        self.executor = executor
+        self.order: List[Path] = list(uses)
+        self.position: Dict[Path, int] = {filepath: index for index, filepath in enumerate(self.order)}
+        self.uses = dict(uses)
+        self.prefetch = prefetch
+        self.futures: Dict[Path, Future] = {}
+        self.trees: Dict[Path, List[nbt.Tag]] = {}
+
+    def _submit(self, filepath: Path) -> Future:
+        future = self.futures.get(filepath)
+        if future is None:
+            future = self.futures[filepath] = self.executor.submit(read_serialized_bytes, filepath)
+        return future
+
+    def serialized_bytes(self, filepath: Path) -> bytes:
+        future = self._submit(filepath)
+        index = self.position.get(filepath)
+        if index is not None:
+            for next_filepath in self.order[index + 1:index + 1 + self.prefetch]:
+                if self.uses[next_filepath]:  # not released
+                    self._submit(next_filepath)
+        return future.result()
+
+    def deserialized_tree(self, filepath: Path) -> List[nbt.Tag]:
+        tree = self.trees.get(filepath)
+        if tree is None:
+            tree = self.trees[filepath] = nbt.deserialize(self.serialized_bytes(filepath))
+        return tree
+
+    def release(self, filepath: Path):
+        """ Called after each test that uses the file has run """
+        self.uses[filepath] -= 1
+        if not self.uses[filepath]:
+            self.futures.pop(filepath, None)
+            self.trees.pop(filepath, None)
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_collection_modifyitems(session, config, items):
+    """ Count the tests using each NBT test data file, in the order they run
+
+    Only a session that runs every item left after collection knows which
+        tests it will run. A pytest-xdist worker is handed a subset of them
+        as it goes, so it counts nothing; its files are simply memoized.
+    """
+    NBT_FILE_TESTS.clear()
+    NBT_FILE_USES.clear()
+    if hasattr(config, "workerinput"):  # pytest-xdist worker
+        return
+    for item in items:
+        callspec = getattr(item, "callspec", None)
+        if callspec is None or "nbt_filepath" not in callspec.params:
+            continue
+        if "serialized_bytes" not in item.fixturenames and "deserialized_tree" not in item.fixturenames:
+            continue
+        filepath = callspec.params["nbt_filepath"]
+        NBT_FILE_TESTS[item.nodeid] = filepath
+        NBT_FILE_USES[filepath] = NBT_FILE_USES.get(filepath, 0) + 1
+
+
+def pytest_runtest_teardown(item, nextitem):
+    filepath = NBT_FILE_TESTS.get(item.nodeid)
+    if filepath is not None and NBT_TEST_DATA is not None:
+        NBT_TEST_DATA.release(filepath)
+
+
+@pytest.fixture(scope="session")
+def nbt_test_data():
+    global NBT_TEST_DATA
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        NBT_TEST_DATA = NBTTestData(executor, NBT_FILE_USES, NBT_FILE_PREFETCH)
+        yield NBT_TEST_DATA
+        NBT_TEST_DATA = None
+
+
+@pytest.fixture(scope="session")
+def serialized_bytes(nbt_test_data):
+    """ read_serialized_bytes(), memoized per file; see NBTTestData
+    """
+    return nbt_test_data.serialized_bytes
+
+
+@pytest.fixture(scope="session")
+def deserialized_tree(nbt_test_data):
+    """ The tree deserialized from a file, memoized per file; see NBTTestData
+
+    Trees are shared between tests; tests that use this mustn't modify them.
+    """
+    return nbt_test_data.deserialized_tree
+
+
+# The pytest cache key of files that reserialized to their original bytes
+RESERIALIZED_CACHE_KEY = "aPyNBT/reserialized"
+
+
+class ReserializedFiles:
+    """ Files known to reserialize to their original bytes (--skip-reserialized)
+
+    A file is known by its path, size and modification time, and a hash of
+        nbt.py. Changing either the file or nbt.py makes it unknown again.
+    """
+
+    def __init__(self, known: List[str]):
+        self.known = frozenset(known)
+        self.confirmed = set()
+        self.source_hash = hashlib.blake2b(Path(nbt.__file__).read_bytes(), digest_size=16).hexdigest()
+
+    def key(self, filepath: Path) -> str:
+        stat = filepath.stat()
+        return f"{self.source_hash}:{filepath}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    def __contains__(self, filepath: Path) -> bool:
+        key = self.key(filepath)
+        if key in self.known:
+            self.confirmed.add(key)
+            return True
+        return False
+
+    def add(self, filepath: Path):
+        self.confirmed.add(self.key(filepath))
+
+
+@pytest.fixture(scope="session")
+def reserialized_files(request):
+    """ ReserializedFiles persisted in the pytest cache
+
+    Without --skip-reserialized, or without the cache (-p no:cacheprovider),
+        no files are known and nothing is saved.
+    """
+    config = request.config
+    cache = getattr(config, "cache", None)
+    if not config.getoption("skip-reserialized") or cache is None:
+        yield ReserializedFiles([])
+        return
+    files = ReserializedFiles(cache.get(RESERIALIZED_CACHE_KEY, []))
+    yield files
+    cache.set(RESERIALIZED_CACHE_KEY, sorted(files.confirmed))
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if PROFILING_NBT and LAST_STATS is not None:
+        save_aggregate_stats()
+
+
 def pytest_generate_tests(metafunc):
     if "nbt_filepath" in metafunc.fixturenames:
         metafunc.parametrize("nbt_filepath", NBT_FILEPATH_FILES, ids=NBT_FILEPATH_IDS)
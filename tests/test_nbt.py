@@ -2,12 +2,19 @@
 """ Tests for nbt.py
 """
 
+import gzip
 from pathlib import Path
+import pickle
+import sys
 
 import pytest
 
 import aPyNBT.nbt as nbt
 
+# Tag types that directly subclass TagInt, in the order of nbt.TAGS
+TAGINT_SUBCLASSES = frozenset(nbt.TagInt.__subclasses__())
+TAGINT_TAGS = [tag_class for tag_class in nbt.TAGS if tag_class in TAGINT_SUBCLASSES]
+
 
 @pytest.mark.skip("only used for profiling")
 def test_deserialize_all_test_data(nbt_filepath: Path):
@@ -15,20 +22,146 @@ def test_deserialize_all_test_data(nbt_filepath: Path):
 
 
 @pytest.mark.skip("only used for profiling")
-def test_reserialize_all_test_data(nbt_filepath: Path):
-    tree = nbt.deserialize_file(nbt_filepath)
+def test_reserialize_all_test_data(nbt_filepath: Path, deserialized_tree):
+    tree = deserialized_tree(nbt_filepath)
     nbt.serialize(tree)
 
 
-def test_reserialize_reference_compared(nbt_filepath: Path):
+def test_reserialize_reference_compared(nbt_filepath: Path, serialized_bytes, deserialized_tree, reserialized_files):
     """
     Same as test_reserialize_reference(), but compare the original bytes to the
     output of the serializer. There should be no difference.
     """
-    orig = nbt.extract_serialized_bytes(nbt_filepath)
-    tree = nbt.deserialize_file(nbt_filepath)
+    if nbt_filepath in reserialized_files:
+        pytest.skip("reserialized unchanged in a previous run (--skip-reserialized)")
+    orig = serialized_bytes(nbt_filepath)
+    tree = deserialized_tree(nbt_filepath)
     data = nbt.serialize(tree)
     assert data == orig
+    reserialized_files.add(nbt_filepath)
+
+
+def test_reserialize_reference_materialized(nbt_filepath: Path, serialized_bytes):
+    """
+    Same as test_reserialize_reference_compared(), but with every array's
+    payload read first. Untouched arrays are written back from the bytes they
+    were read from; this checks that their payloads serialize the same.
+    """
+    orig = serialized_bytes(nbt_filepath)
+    tree = nbt.deserialize(orig)  # not the shared tree; it's modified below
+    _read_array_payloads(tree)
+    assert nbt.serialize(tree) == orig
+
+
+def test_reserialize_materialized_arrays():
+    """ Arrays in compounds and lists serialize the same once their payloads are read
+    """
+    orig = nbt.serialize([nbt.TAG_Compound(name="root", payload=[
+        nbt.TAG_Byte_Array(name="byte array", payload=bytearray(b'\x00\x01\xff')),
+        nbt.TAG_Int_Array(name="int array", payload=[1, -2, 3]),
+        nbt.TAG_Long_Array(name="long array", payload=[1, -2, 2 ** 40]),
+        nbt.TAG_List(name="list of arrays", tagID=nbt.TAG_Int_Array.tid, payload=[
+            nbt.TAG_Int_Array(payload=[4, -5], named=False, tagged=False),
+            nbt.TAG_Int_Array(payload=[], named=False, tagged=False),
+        ]),
+        nbt.TAG_End()
+    ])])
+    tree = nbt.deserialize(orig)
+    assert _read_array_payloads(tree) == 5
+    assert nbt.serialize(tree) == orig
+
+
+def _read_array_payloads(tree) -> int:
+    """ Read the payload of every array in the tree, returning how many there are """
+    count = 0
+    stack = list(tree)
+    while stack:
+        tag = stack.pop()
+        if isinstance(tag, nbt.TagArray):
+            assert tag.payload is not None and tag._raw is None
+            count += 1
+        elif isinstance(tag, (nbt.TAG_Compound, nbt.TAG_List)):
+            stack.extend(element for element in tag.payload if isinstance(element, nbt.Tag))
+    return count
+
+
+def test_deserialize_file_memory_map(nbt_filepath: Path, tmp_path: Path, deserialized_tree):
+    """ An uncompressed file deserializes the same whether it's mapped or read
+    """
+    tree = deserialized_tree(nbt_filepath)
+    uncompressed_filepath = tmp_path / "uncompressed.nbt"
+    nbt.serialize_file(uncompressed_filepath, tree, compress=False)
+
+    mapped_tree = nbt.deserialize_file(uncompressed_filepath, memory_map=True)
+    assert nbt.serialize(mapped_tree) == nbt.serialize(tree)
+
+
+def test_serialize_file_gzip_header(tmp_path: Path):
+    """ Compressed files don't record the output file name in the gzip header
+    """
+    tree = [nbt.TAG_String(payload="payload", name="")]
+    filepath = tmp_path / "compressed.nbt"
+    nbt.serialize_file(filepath, tree)
+
+    data = filepath.read_bytes()
+    assert data[:2] == b'\x1f\x8b'
+    assert not data[3] & 0x08  # FLG.FNAME
+    assert filepath.name.encode() not in data
+    assert gzip.decompress(data) == nbt.serialize(tree)
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_serialize_file_failure(tmp_path: Path, compress: bool):
+    """ A tree that fails to serialize leaves an existing file as it was
+    """
+    filepath = tmp_path / "existing.nbt"
+    filepath.write_bytes(b"original")
+    tree = [
+        nbt.TAG_String(payload="written first", name=""),
+        nbt.TAG_Compound(name="no TAG_End", payload=[nbt.TAG_Byte(name="byte", payload=1)]),
+    ]
+    with pytest.raises(AssertionError):
+        nbt.serialize_file(filepath, tree, compress=compress)
+    assert filepath.read_bytes() == b"original"
+    assert list(tmp_path.iterdir()) == [filepath]  # no temporary file is left
+
+
+def test_serialize_file_replaces(tmp_path: Path):
+    """ A memory-mapped tree can be written back to its own file
+    """
+    filepath = tmp_path / "mapped.nbt"
+    tree = [nbt.TAG_Compound(name="root", payload=[
+        nbt.TAG_Int_Array(name="int array", payload=[1, 2, 3]),
+        nbt.TAG_End()
+    ])]
+    nbt.serialize_file(filepath, tree, compress=False)
+    filepath.chmod(0o640)
+
+    mapped_tree = nbt.deserialize_file(filepath, memory_map=True)
+    nbt.serialize_file(filepath, mapped_tree, compress=False)
+    assert filepath.read_bytes() == nbt.serialize(tree)
+    assert filepath.stat().st_mode & 0o777 == 0o640
+    assert list(tmp_path.iterdir()) == [filepath]
+
+
+def test_extract_serialized_bytes(nbt_filepath: Path, serialized_bytes):
+    """ The library's streaming decompression matches the fixture's one-shot zlib
+    """
+    assert nbt.extract_serialized_bytes(nbt_filepath) == serialized_bytes(nbt_filepath)
+
+
+def test_extract_serialized_bytes_gzip_members(tmp_path: Path):
+    """ The size at the end of a gzip file is only a hint of the data's size
+    """
+    # The size at the end of a file of two gzip members is just the last's.
+    data = nbt.TAG_String(payload="first", name="").serialize()
+    data2 = nbt.TAG_String(payload="second", name="").serialize()
+    filepath = tmp_path / "members.nbt"
+    filepath.write_bytes(gzip.compress(data) + gzip.compress(data2))
+    assert nbt.extract_serialized_bytes(filepath) == data + data2
+
+    filepath.write_bytes(gzip.compress(data2) + gzip.compress(data))
+    assert nbt.extract_serialized_bytes(filepath) == data2 + data
 
 
 def test_tag_named_attr():
@@ -125,35 +258,36 @@ def test_repr(tag_instance):
 
 @pytest.mark.parametrize(
     "tag_class",
-    [tag_class for tag_class in nbt.TAGS if tag_class in nbt.TagInt.__subclasses__()]
+    TAGINT_TAGS
 )
 def test_tagint_serialization_lengths(tag_class):
     """
     Confirm TagInt's shared serialization method preserves the type width
     """
     tag = tag_class(name="", payload=9)  # 9 is a random value
-    assert len(tag.serialize()) == 1 + 2 + tag.width  # 4
+    assert tag.serialized_size() == 1 + 2 + tag.width  # 4
 
     tag = tag_class(name="", payload=9, tagged=False)
-    assert len(tag.serialize()) == 0 + 2 + tag.width  # 3
+    assert tag.serialized_size() == 0 + 2 + tag.width  # 3
 
     tag = tag_class(payload=9)
-    assert len(tag.serialize()) == 1 + 0 + tag.width  # 2
+    assert tag.serialized_size() == 1 + 0 + tag.width  # 2
 
     tag = tag_class(name="named tag", payload=9, named=True, tagged=False)
-    assert len(tag.serialize()) > 1 + 2 + tag.width   # at least
+    assert tag.serialized_size() > 1 + 2 + tag.width   # at least
 
 
 @pytest.mark.parametrize(
-    "tag",
+    "tag_class,name,tagged",
     [
-        tag_class(name=name, payload=42, named=(not not name), tagged=tagged)
-        for tag_class in nbt.TAGS if tag_class in nbt.TagInt.__subclasses__()
+        (tag_class, name, tagged)
+        for tag_class in TAGINT_TAGS
         for name in ("", "named tag")
         for tagged in (True, False)
     ]
 )
-def test_tagint_payload_serialization(tag):
+def test_tagint_payload_serialization(tag_class, name, tagged):
+    tag = tag_class(name=name, payload=42, named=(not not name), tagged=tagged)
     for i in range(-10, 10):
         tag.payload = i                     # property setter test
         assert tag.payload == i             # property getter test
@@ -182,12 +316,34 @@ def test_tag_byte_payload_validation():
         tag.validate()
 
 
-def test_tag_float():
-    pass  # TODO
+@pytest.mark.parametrize("tag_class", [nbt.TAG_Float, nbt.TAG_Double])
+def test_tag_float(tag_class):
+    """ TAG_Float and TAG_Double
+    """
+    # 0.5 and -2.25 are exactly representable by both widths.
+    for value in (0.0, 0.5, -2.25, float("inf")):
+        tag = tag_class(payload=value, tagged=False)
+        tag.validate()
+        data = tag.serialize()
+        assert len(data) == tag.width
+        tag2 = tag_class(nbt_data=memoryview(data), named=False, tagged=False)
+        assert tag2.payload == value
+
+    # The payload must be of type `float`
+    with pytest.raises(AssertionError):
+        tag_class(payload=1, tagged=False).validate()
 
 
-def test_tag_double():
-    pass  # TODO
+def test_tag_float_precision():
+    """ TAG_Float is single precision; TAG_Double is double precision
+    """
+    data = nbt.TAG_Float(payload=0.1, named=False, tagged=False).serialize()
+    tag = nbt.TAG_Float(nbt_data=memoryview(data), named=False, tagged=False)
+    assert tag.payload != 0.1 and abs(tag.payload - 0.1) < 1e-8
+    assert tag.serialize() == data
+
+    data = nbt.TAG_Double(payload=0.1, named=False, tagged=False).serialize()
+    assert nbt.TAG_Double(nbt_data=memoryview(data), named=False, tagged=False).payload == 0.1
 
 
 def test_tag_byte_array_payload_validation():
@@ -315,3 +471,238 @@ def test_tag_compound():
     tag.payload = [tag_string]
     with pytest.raises(AssertionError):
         tag.validate()
+
+
+def test_tag_byte_array_list_payload():
+    """ A byte array's payload may be given as a list of ints
+    """
+    tag = nbt.TAG_Byte_Array(name="a", payload=[1, 2, 255])
+    data = tag.serialize()
+    assert data == nbt.TAG_Byte_Array(name="a", payload=bytearray(b'\x01\x02\xff')).serialize()
+    assert tag.serialized_size() == len(data)
+    assert nbt.TAG_Byte_Array(nbt_data=memoryview(data)).payload == bytearray(b'\x01\x02\xff')
+
+
+@pytest.mark.parametrize(
+    "tag_class,payload",
+    [
+        (nbt.TAG_Byte_Array, bytearray(b'\x00\x01\xff')),
+        (nbt.TAG_Int_Array, [1, -2, 3]),
+        (nbt.TAG_Long_Array, [1, -2, 2 ** 40]),
+    ]
+)
+def test_tag_array_lazy_payload(tag_class, payload):
+    """ Arrays are only converted to Python objects when the payload is read
+    """
+    data = tag_class(name="lazy", payload=payload).serialize()
+
+    # An untouched array is written back using the original bytes.
+    tag = tag_class(nbt_data=memoryview(data))
+    assert tag._raw is not None
+    assert tag.serialize() == data
+
+    # Reading the payload converts it, and modifications are serialized.
+    assert tag.payload == payload
+    assert tag._raw is None
+    tag.payload.append(payload[0])
+    tag2 = tag_class(nbt_data=memoryview(tag.serialize()))
+    assert tag2.payload == payload + payload[:1]
+
+
+def test_tag_end_singleton():
+    """ Deserialized compounds share one TAG_End instance
+    """
+    data = nbt.TAG_Compound(payload=[
+        nbt.TAG_Compound(payload=[nbt.TAG_End()], name="inner"),
+        nbt.TAG_End()
+    ], name="outer").serialize()
+    outer = nbt.TAG_Compound(nbt_data=memoryview(data))
+    inner = outer.payload[0]
+    assert outer.payload[-1] is nbt.TAG_END_SINGLETON
+    assert inner.payload[-1] is nbt.TAG_END_SINGLETON
+    assert outer.serialize() == data
+
+
+@pytest.mark.parametrize("tag_class", nbt.TAGS)
+def test_tag_slots(tag_class):
+    """ Every class in a tag's hierarchy declares __slots__, so no tag has a __dict__
+    """
+    for cls in tag_class.__mro__[:-1]:  # except `object`
+        assert "__slots__" in cls.__dict__
+    assert not hasattr(tag_class(), "__dict__")
+
+
+def test_tag_name_cache():
+    """ Equal names share one string object after deserialization
+    """
+    data = nbt.TAG_Byte(payload=0, name="".join(["cached", "name"])).serialize()
+    tag1 = nbt.TAG_Byte(nbt_data=memoryview(data))
+    tag2 = nbt.TAG_Byte(nbt_data=memoryview(data))
+    assert tag1.name == "cachedname"
+    assert tag1.name is tag2.name
+
+
+def test_tag_string_cache():
+    """ Equal short strings share one string object after deserialization
+    """
+    data = nbt.TAG_String(payload="minecraft:stone", name="").serialize()
+    tag1 = nbt.TAG_String(nbt_data=memoryview(data))
+    tag2 = nbt.TAG_String(nbt_data=memoryview(data))
+    assert tag1.payload == "minecraft:stone"
+    assert tag1.payload is tag2.payload
+
+    long_string = "x" * (nbt.STRING_CACHE_MAX_LENGTH + 1)
+    data = nbt.TAG_String(payload=long_string, name="").serialize()
+    assert nbt.TAG_String(nbt_data=memoryview(data)).payload == long_string
+
+
+def test_deeply_nested_deserialization():
+    """ Nesting deeper than the recursion limit doesn't raise RecursionError
+    """
+    depth = sys.getrecursionlimit() * 2
+
+    # A TAG_List of TAG_List of ... of an empty TAG_List (of TAG_End)
+    data = b'\x09\x00\x00'
+    data += b'\x09\x00\x00\x00\x01' * depth
+    data += b'\x00\x00\x00\x00\x00'
+    tree = nbt.deserialize(data)
+    assert len(tree) == 1 and tree[0]._size == len(data)
+
+    tag = tree[0]
+    for level in range(depth):
+        assert tag.tagID == nbt.TAG_List.tid and len(tag.payload) == 1
+        tag = tag.payload[0]
+        assert tag._size == len(data) - 3 - (5 * (level + 1))
+    assert tag.payload == []
+
+
+@pytest.mark.parametrize(
+    "tag_class,payload",
+    [
+        (nbt.TAG_Byte, [-128, 0, 127]),
+        (nbt.TAG_Short, [-32768, 1, 32767]),
+        (nbt.TAG_Int, [-2 ** 31, 2, 2 ** 31 - 1]),
+        (nbt.TAG_Long, [-2 ** 63, 3, 2 ** 63 - 1]),
+        (nbt.TAG_Float, [0.5, -1.0]),
+        (nbt.TAG_Double, [0.25, -1e100]),
+        (nbt.TAG_Int_Array, [nbt.TAG_Int_Array(payload=[1, 2], named=False, tagged=False)]),
+    ]
+)
+def test_tag_list_reserialization(tag_class, payload):
+    """ Lists of numerics (and of numeric arrays) survive a round-trip
+    """
+    tag = nbt.TAG_List(payload=payload, tagID=tag_class.tid, name="list")
+    data = tag.serialize()
+    tag2 = nbt.TAG_List(nbt_data=memoryview(data))
+    assert tag2.tagID == tag_class.tid
+    assert len(tag2.payload) == len(payload)
+    assert tag2.serialize() == data
+
+
+def test_deserialize_from_bytes():
+    """ Tags can be deserialized from `bytes` as well as from a memoryview
+    """
+    data = nbt.TAG_String(payload="from bytes", name="a name").serialize()
+    tag = nbt.TAG_String(nbt_data=data)
+    assert tag.name == "a name" and tag.payload == "from bytes"
+    assert type(tag.serialize()) is bytes
+
+
+def _every_tag_type_compound() -> nbt.TAG_Compound:
+    """ A compound containing a tag of every type (except TAG_End) """
+    return nbt.TAG_Compound(name="root", payload=[
+        nbt.TAG_Byte(name="byte", payload=-1),
+        nbt.TAG_Short(name="short", payload=-2),
+        nbt.TAG_Int(name="int", payload=-3),
+        nbt.TAG_Long(name="long", payload=-4),
+        nbt.TAG_Float(name="float", payload=0.5),
+        nbt.TAG_Double(name="double", payload=0.25),
+        nbt.TAG_Byte_Array(name="byte array", payload=bytearray(b'\x01\x02')),
+        nbt.TAG_String(name="string", payload="a string"),
+        nbt.TAG_List(name="list of ints", tagID=nbt.TAG_Int.tid, payload=[1, 2]),
+        nbt.TAG_List(name="list of strings", tagID=nbt.TAG_String.tid, payload=["a", "b"]),
+        nbt.TAG_List(name="list of compounds", tagID=nbt.TAG_Compound.tid, payload=[
+            nbt.TAG_Compound(payload=[nbt.TAG_End()], named=False, tagged=False)
+        ]),
+        nbt.TAG_List(name="empty list", tagID=nbt.TAG_End.tid, payload=[]),
+        nbt.TAG_Compound(name="compound", payload=[
+            nbt.TAG_String(name="nested", payload="a nested string"),
+            nbt.TAG_End()
+        ]),
+        nbt.TAG_Int_Array(name="int array", payload=[1, -1]),
+        nbt.TAG_Long_Array(name="long array", payload=[2, -2]),
+        nbt.TAG_End()
+    ])
+
+
+def test_serialized_size():
+    """ serialized_size() is the length of serialize()'s output """
+    root = _every_tag_type_compound()
+    for tag in [root] + root.payload:
+        assert tag.serialized_size() == len(tag.serialize())
+    unnamed = nbt.TAG_Compound(payload=[nbt.TAG_End()], named=False, tagged=False)
+    assert unnamed.serialized_size() == len(unnamed.serialize())
+
+    # Lists of arrays, lists whose tagID isn't set, and non-ASCII strings
+    tags = [
+        nbt.TAG_List(name="list of arrays", tagID=nbt.TAG_Long_Array.tid, payload=[
+            nbt.TAG_Long_Array(payload=[1, 2, 3], named=False, tagged=False)
+        ]),
+        nbt.TAG_List(name="no tagID", payload=[
+            nbt.TAG_Byte_Array(payload=bytearray(b'\x01'), named=False, tagged=False)
+        ]),
+        nbt.TAG_String(name="non-ascii \u00e9", payload="\u2603"),
+        nbt.TAG_List(name="list of non-ascii strings", tagID=nbt.TAG_String.tid, payload=["\u00e9", ""]),
+    ]
+    for tag in tags:
+        assert tag.serialized_size() == len(tag.serialize())
+
+    # Deserialized arrays are sized from their bytes, before and after reading their payloads
+    data = root.serialize()
+    deserialized = nbt.TAG_Compound(nbt_data=memoryview(data))
+    assert deserialized.serialized_size() == len(data)
+    _read_array_payloads([deserialized])
+    assert deserialized.serialized_size() == len(data)
+
+
+def test_deserialize_iter():
+    """ Each root is yielded in order """
+    roots = [nbt.TAG_String(payload=str(i), name=str(i)) for i in range(3)]
+    data = nbt.serialize(roots)
+    assert [tag.payload for tag in nbt.deserialize_iter(data)] == ["0", "1", "2"]
+
+
+def test_skip_payload():
+    """ Skipping a payload ends at the same offset as deserializing it """
+    root = _every_tag_type_compound()
+    data = memoryview(root.serialize())
+    assert nbt.skip_payload(data, 3 + len("root"), nbt.TAG_Compound.tid) == len(data)
+
+    offset = 3 + len("root")
+    for tag in root.payload[:-1]:
+        payload_offset = offset + 3 + len(tag.name.encode('utf-8'))
+        assert nbt.skip_payload(data, payload_offset, tag.tid) == offset + len(tag.serialize())
+        offset += len(tag.serialize())
+
+
+def test_deserialize_path():
+    """ Only the tag at the path is deserialized """
+    root = _every_tag_type_compound()
+    data = nbt.serialize([nbt.TAG_String(payload="", name="first"), root])
+
+    for tag in root.payload[:-1]:
+        found = nbt.deserialize_path(data, tag.name)
+        assert found.serialize() == tag.serialize()
+
+    assert nbt.deserialize_path(data, "compound/nested").payload == "a nested string"
+    assert nbt.deserialize_path(data, "compound/missing") is None
+    assert nbt.deserialize_path(data, "string/nested") is None
+
+
+def test_pickle():
+    """ Deserialized trees can be pickled, including lazily-deserialized arrays
+    """
+    data = _every_tag_type_compound().serialize()
+    tree = nbt.deserialize(data)
+    pickled_tree = pickle.loads(pickle.dumps(tree, pickle.HIGHEST_PROTOCOL))
+    assert nbt.serialize(pickled_tree) == data
@@ -2,38 +2,41 @@
 """ Tests for region.py
 """
 
+from concurrent.futures import ProcessPoolExecutor
+import gzip
 import os
 
 import pytest
 
+import aPyNBT.nbt as nbt
 import aPyNBT.region as region
 
 
 @pytest.mark.parametrize(
-    "filename,coords",
+    "basename,coords",
     [
-        ("r.0.0.mcr",       (0,0)),
-        ("r.0.1.mcr",       (0,1)),
-        ("r.0.2.mcr",       (0,2)),
-        ("r.-1.0.mcr",      (-1,0)),
-        ("r.-2.0.mcr",      (-2,0)),
-        ("r.-3.0.mcr",      (-3,0)),
-        ("r.-1.-4.mcr",     (-1,-4)),
-        ("r.-2.-5.mcr",     (-2,-5)),
-        ("r.-3.-6.mcr",     (-3,-6)),
-        ("r.-123.123.mcr",  (-123,123)),
-        ("r.123.-123.mcr",  (123,-123)),
-        ("r.-123456789.-123456789.mcr",  (-123456789,-123456789)),
+        ("r.0.0",          (0,0)),
+        ("r.0.1",          (0,1)),
+        ("r.0.2",          (0,2)),
+        ("r.-1.0",         (-1,0)),
+        ("r.-2.0",         (-2,0)),
+        ("r.-3.0",         (-3,0)),
+        ("r.-1.-4",        (-1,-4)),
+        ("r.-2.-5",        (-2,-5)),
+        ("r.-3.-6",        (-3,-6)),
+        ("r.-123.123",     (-123,123)),
+        ("r.123.-123",     (123,-123)),
+        ("r.-123456789.-123456789",  (-123456789,-123456789)),
     ]
 )
-def test_coords_from_filename(filename, coords):
-    # mcr
-    coords_from_filename = region.coords_from_filename(filename)
-    assert coords_from_filename == coords
-    # mca
-    filename = filename.replace("mcr", "mca")
+@pytest.mark.parametrize("extension", ["mcr", "mca"])
+def test_coords_from_filename(basename, coords, extension):
+    filename = f"{basename}.{extension}"
     coords_from_filename = region.coords_from_filename(filename)
     assert coords_from_filename == coords
+    # paths and other names containing a region filename
+    for name in (os.path.join("region", filename), filename + ".bak"):
+        assert region.coords_from_filename(name) == coords
 
 
 def test_coords_from_region_references(region_filepath):
@@ -54,7 +57,7 @@ def test_region_reserialization(region_filepath):
     new_bytes = orig_region.serialize()
     new_region = region.Region(region_data=new_bytes, x=orig_region.x, z=orig_region.z)
     assert len(new_bytes) >= 8 * 1024  # 8KiB header, at least
-    assert len(list(new_region)) == len(list(orig_region))  # number of 'chunks' are equal
+    assert new_region.chunks.count(None) == orig_region.chunks.count(None)  # number of 'chunks' are equal
 
 
 @pytest.mark.skip("only used for profiling")
@@ -69,4 +72,67 @@ def test_anvil_reserialization(anvil_filepath):
     new_bytes = orig_region.serialize()
     new_region = region.Region(region_data=new_bytes, x=orig_region.x, z=orig_region.z)
     assert len(new_bytes) >= 8 * 1024  # 8KiB header, at least
-    assert len(list(new_region)) == len(list(orig_region))  # number of 'chunks' are equal
+    assert new_region.chunks.count(None) == orig_region.chunks.count(None)  # number of 'chunks' are equal
+
+
+def _synthetic_region() -> region.Region:
+    """ A region with a zlib-compressed chunk and a gzip-compressed chunk """
+    synthetic_region = region.Region(region_data=None, x=0, z=0)
+    for x, z, compression in ((0, 0, region.Compression.ZLIB), (5, 31, region.Compression.GZIP)):
+        index = region.chunk_index(x, z)
+        synthetic_region.chunks[index] = [nbt.TAG_Compound(name="", payload=[
+            nbt.TAG_Int_Array(name="coords", payload=[x, z]),
+            nbt.TAG_End()
+        ])]
+        synthetic_region.compression[index] = compression
+        synthetic_region.timestamps[index] = x + z
+    return synthetic_region
+
+
+def _serialized_chunks(r: region.Region) -> list:
+    """ Compressed chunks aren't compared; gzip includes a timestamp """
+    return [nbt.serialize(chunk) if chunk is not None else None for chunk in r]
+
+
+def test_region_executor_deserialization():
+    """ Chunks deserialized by a process pool match those deserialized serially
+    """
+    orig_region = _synthetic_region()
+    region_data = orig_region.serialize()
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        new_region = region.Region(region_data=region_data, x=0, z=0, executor=executor)
+    assert _serialized_chunks(new_region) == _serialized_chunks(orig_region)
+    assert new_region.chunks[region.chunk_index(5, 31)][0].payload[0].payload == [5, 31]
+
+
+@pytest.mark.parametrize("decompression_threads", [1, 2])
+def test_region_decompression_threads(monkeypatch, decompression_threads):
+    """ Chunks are the same whether or not they're decompressed by threads
+    """
+    monkeypatch.setattr(region, "DECOMPRESSION_THREADS", decompression_threads)
+    orig_region = _synthetic_region()
+    region_data = orig_region.serialize()
+    new_region = region.Region(region_data=region_data, x=0, z=0)
+    assert _serialized_chunks(new_region) == _serialized_chunks(orig_region)
+    assert new_region.chunks[region.chunk_index(5, 31)][0].payload[0].payload == [5, 31]
+    # Tag names are shared between chunks rather than decoded per chunk
+    first_coords = new_region.chunks[region.chunk_index(0, 0)][0].payload[0]
+    second_coords = new_region.chunks[region.chunk_index(5, 31)][0].payload[0]
+    assert first_coords.name is second_coords.name
+
+
+def test_region_deserialize_file(tmp_path):
+    """ A region file is deserialized the same as the region's bytes
+    """
+    orig_region = _synthetic_region()
+    region_filepath = tmp_path / "r.0.0.mca"
+    region_filepath.write_bytes(orig_region.serialize())
+    new_region = region.deserialize_file(str(region_filepath))
+    assert (new_region.x, new_region.z) == (0, 0)
+    assert _serialized_chunks(new_region) == _serialized_chunks(orig_region)
+
+
+def test_decompress_chunk_data_gzip_members():
+    """ Every member of a gzip-compressed chunk is decompressed """
+    chunk_data = gzip.compress(b"first") + gzip.compress(b"second")
+    assert region.decompress_chunk_data(chunk_data, region.Compression.GZIP) == b"firstsecond"